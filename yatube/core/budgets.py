@@ -0,0 +1,161 @@
+"""Бюджеты запросов к базе для видов.
+
+    @query_budget(queries=4, sql_ms=50)
+    def post_detail(request, post_id):
+        ...
+
+Декоратор считает запросы и время SQL внутри вида, включая шаблоны,
+которые он рендерит, и сверяет их с бюджетом. Так незаметный рост
+числа запросов (новый {{ post.author.stats }} в шаблоне) ловится
+сразу. При QUERY_BUDGET_STRICT превышение — исключение со списком
+запросов, иначе — предупреждение в журнал core.budgets и сигнал
+budget_exceeded для метрик. Все бюджеты собраны в BUDGETS по имени
+вида.
+
+Запросы, которыми загружается request.user, делаются до замера и в
+бюджет не входят.
+
+Если число запросов зависит от настроек, queries может быть функцией
+без аргументов: она вызывается на каждом запросе.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов показывать в отчёте о превышении.
+REPORTED_QUERIES = 50
+# Сколько символов SQL и параметров одного запроса попадает в отчёт.
+REPORTED_SQL_CHARS = 500
+
+budget_exceeded = Signal(providing_args=['view', 'violations', 'queries'])
+
+BUDGETS = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Budget:
+    def __init__(self, queries, sql_ms=None):
+        self.queries = queries
+        self.sql_ms = sql_ms
+
+    def limit(self):
+        return self.queries() if callable(self.queries) else self.queries
+
+    def violations(self, log):
+        violations = []
+        limit = self.limit()
+        if len(log.queries) > limit:
+            violations.append(
+                f'{len(log.queries)} запросов при бюджете {limit}'
+            )
+        if self.sql_ms is not None and log.sql_ms > self.sql_ms:
+            violations.append(
+                f'SQL {log.sql_ms:.1f} мс при бюджете {self.sql_ms} мс'
+            )
+        return violations
+
+
+class QueryLog:
+    """Запросы вида: (sql, params, мс)."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, params, (time.perf_counter() - start) * 1000)
+            )
+
+    @property
+    def sql_ms(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def report(self):
+        lines = [
+            f'{number}. ({duration:.2f} мс) {shorten(sql)} '
+            f'{shorten(repr(params))}'
+            for number, (sql, params, duration)
+            in enumerate(self.queries[:REPORTED_QUERIES], 1)
+        ]
+        hidden = len(self.queries) - REPORTED_QUERIES
+        if hidden > 0:
+            lines.append(f'… и ещё {hidden}')
+        return '\n'.join(lines)
+
+
+def shorten(text):
+    """Обрезает SQL или параметры до REPORTED_SQL_CHARS символов."""
+    if len(text) <= REPORTED_SQL_CHARS:
+        return text
+    return f'{text[:REPORTED_SQL_CHARS]}… ({len(text)} символов)'
+
+
+def view_name(view):
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+def query_budget(queries, sql_ms=None):
+    """Не больше queries запросов и sql_ms миллисекунд SQL на вид."""
+    budget = Budget(queries, sql_ms)
+
+    def decorator(view):
+        name = view_name(view)
+        BUDGETS[name] = budget
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Пользователь сессии ленивый, и шапка любой страницы читала бы
+            # его внутри бюджета; эти запросы — дело middleware, а не вида.
+            user = getattr(request, 'user', None)
+            if user is not None:
+                user.is_authenticated
+            log = QueryLog()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(log))
+                response = view(request, *args, **kwargs)
+            violations = budget.violations(log)
+            if violations:
+                _exceeded(name, violations, log)
+            return response
+        return wrapper
+    return decorator
+
+
+def _exceeded(name, violations, log):
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(
+            f'{name}: {"; ".join(violations)}\n{log.report()}'
+        )
+    logger.warning(json.dumps({
+        'view': name,
+        'violations': violations,
+        'queries': len(log.queries),
+        'sql_ms': round(log.sql_ms, 2),
+        'sql': [
+            {
+                'sql': shorten(sql),
+                'params': shorten(repr(params)),
+                'ms': round(duration, 2),
+            }
+            for sql, params, duration in log.queries[:REPORTED_QUERIES]
+        ],
+    }, ensure_ascii=False))
+    budget_exceeded.send(
+        sender=None, view=name, violations=violations, queries=log.queries
+    )
@@ -0,0 +1,309 @@
+"""Кэш Django в файле SQLite, общий для всех процессов одной машины.
+
+Файл открывается в режиме WAL: читатели не блокируют писателя,
+а все воркеры gunicorn видят одни и те же записи и сбросы.
+Размер ограничен числом записей (MAX_ENTRIES) и суммарным объёмом
+значений в байтах (MAX_SIZE); при переполнении сначала удаляются
+просроченные записи, затем давно не читанные (LRU).
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.instrumentation import record_cache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entry_insert
+AFTER INSERT ON cache_entry BEGIN
+    UPDATE cache_stats
+    SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_delete
+AFTER DELETE ON cache_entry BEGIN
+    UPDATE cache_stats
+    SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_resize
+AFTER UPDATE OF size ON cache_entry BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size WHERE id = 1;
+END;
+'''
+
+UPSERT = '''
+INSERT INTO cache_entry (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+'''
+
+# SQLite ограничивает число параметров в одном запросе.
+MAX_PARAMS = 900
+
+
+def _expired(expires, now):
+    return expires is not None and expires <= now
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        # Время доступа обновляется не чаще раза в столько секунд,
+        # чтобы частые чтения одного ключа не превращались в записи.
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 1)
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dump(self, value):
+        return sqlite3.Binary(pickle.dumps(value, self.pickle_protocol))
+
+    def _store(self, conn, key, value, timeout, now):
+        data = self._dump(value)
+        conn.execute(
+            UPSERT,
+            (key, data, self.get_backend_timeout(timeout), now, len(data))
+        )
+
+    def _over_limit(self, conn):
+        entries, size = conn.execute(
+            'SELECT entries, bytes FROM cache_stats WHERE id = 1'
+        ).fetchone()
+        overflow = entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size
+        )
+        return entries if overflow else 0
+
+    def _cull(self, conn, now):
+        if not self._over_limit(conn):
+            return
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache_entry')
+            return
+        conn.execute(
+            'DELETE FROM cache_entry WHERE expires <= ?', (now,)
+        )
+        entries = self._over_limit(conn)
+        while entries:
+            count = max(
+                entries - self._max_entries,
+                entries // self._cull_frequency,
+                1,
+            )
+            conn.execute(
+                'DELETE FROM cache_entry WHERE key IN ('
+                'SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+                (count,)
+            )
+            entries = self._over_limit(conn)
+
+    def _touch_access(self, conn, key, accessed, now):
+        if now - accessed >= self._access_resolution:
+            conn.execute(
+                'UPDATE cache_entry SET accessed = ? WHERE key = ?',
+                (now, key)
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT expires FROM cache_entry WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and not _expired(row[0], now):
+                return False
+            self._store(conn, key, value, timeout, now)
+            self._cull(conn, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        name = self._key(key, version)
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?',
+            (name,)
+        ).fetchone()
+        if row is None:
+            record_cache(hits=(), misses=(key,))
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if _expired(expires, now):
+            conn.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (name, now)
+            )
+            record_cache(hits=(), misses=(key,))
+            return default
+        self._touch_access(conn, name, accessed, now)
+        record_cache(hits=(key,), misses=())
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        conn = self._connection()
+        now = time.time()
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), MAX_PARAMS):
+            chunk = names[start:start + MAX_PARAMS]
+            rows = conn.execute(
+                'SELECT key, value, expires, accessed FROM cache_entry '
+                'WHERE key IN ({})'.format(', '.join('?' * len(chunk))),
+                chunk
+            )
+            for key, value, expires, accessed in rows.fetchall():
+                if _expired(expires, now):
+                    continue
+                self._touch_access(conn, key, accessed, now)
+                found[keys[key]] = pickle.loads(value)
+        record_cache(
+            hits=list(found),
+            misses=[key for key in keys.values() if key not in found],
+        )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            self._store(conn, key, value, timeout, now)
+            self._cull(conn, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as conn:
+            for key, value in data.items():
+                self._store(conn, self._key(key, version), value, timeout, now)
+            self._cull(conn, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            cursor = conn.execute(
+                'UPDATE cache_entry SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись в одной
+        транзакции BEGIN IMMEDIATE."""
+        name = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?',
+                (name,)
+            ).fetchone()
+            if row is None or _expired(row[1], now):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            data = self._dump(new_value)
+            conn.execute(
+                'UPDATE cache_entry SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (data, len(data), now, name)
+            )
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT expires FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None and not _expired(row[0], time.time())
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            cursor = conn.execute(
+                'DELETE FROM cache_entry WHERE key = ?', (key,)
+            )
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        with self._write() as conn:
+            for start in range(0, len(names), MAX_PARAMS):
+                chunk = names[start:start + MAX_PARAMS]
+                conn.execute(
+                    'DELETE FROM cache_entry WHERE key IN ({})'.format(
+                        ', '.join('?' * len(chunk))
+                    ),
+                    chunk
+                )
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache_entry')
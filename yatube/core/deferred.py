@@ -0,0 +1,45 @@
+"""Работа, которую запрос откладывает до отдачи ответа.
+
+after_response(func, *args) внутри запроса ставит вызов в очередь
+запроса, и он выполняется по сигналу request_finished, когда сервер
+уже отдал ответ клиенту: время ответа и бюджет запросов вида
+(core.budgets) на эту работу не тратятся. Вне запроса — в командах,
+фоновых потоках, тестах на ORM — вызов выполняется сразу.
+
+Ошибки отложенной работы пишутся в журнал core.deferred и не
+мешают остальным вызовам в очереди.
+"""
+import logging
+from contextvars import ContextVar
+
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_queue = ContextVar('deferred_queue', default=None)
+
+
+def after_response(func, *args, **kwargs):
+    queue = _queue.get()
+    if queue is None:
+        func(*args, **kwargs)
+    else:
+        queue.append((func, args, kwargs))
+
+
+@receiver(request_started)
+def _open_queue(sender, **kwargs):
+    _queue.set([])
+
+
+@receiver(request_finished)
+def _run_queue(sender, **kwargs):
+    queue = _queue.get()
+    _queue.set(None)
+    # Отложенная работа может отложить новую; она выполнится сразу.
+    for func, args, kwargs in queue or ():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception('Отложенный вызов %r не удался', func)
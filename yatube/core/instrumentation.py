@@ -0,0 +1,90 @@
+"""Замеры текущего запроса: SQL, рендеринг шаблонов и обращения к кэшу.
+
+collect() открывает замер и на время запроса оборачивает выполнение
+SQL на всех соединениях (connection.execute_wrapper). Шаблоны и кэш
+сообщают о себе сами через measure_template() и record_cache(), когда
+замер открыт, и ничего не делают вне его, так что незамеряемые
+запросы почти ничего не платят. Вложенный collect() продолжает уже
+открытый замер. Обращения к кэшу, кроме того, всегда считаются в
+метриках core.metrics.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+from core import metrics
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; время в секундах."""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - start
+
+
+def current():
+    """Замер текущего запроса или None, если запрос не замеряется."""
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    request_metrics = current()
+    if request_metrics is not None:
+        yield request_metrics
+        return
+    request_metrics = RequestMetrics()
+    token = _current.set(request_metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request_metrics.execute)
+                )
+            yield request_metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def measure_template():
+    """Учитывает время рендеринга; вложенные шаблоны не считаются
+    повторно."""
+    request_metrics = current()
+    if request_metrics is None:
+        yield
+        return
+    request_metrics._template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics._template_depth -= 1
+        if not request_metrics._template_depth:
+            request_metrics.template_time += time.perf_counter() - start
+
+
+def record_cache(hits, misses):
+    """hits и misses — ключи, найденные и не найденные в кэше."""
+    metrics.cache_lookups(hits, misses)
+    request_metrics = current()
+    if request_metrics is not None:
+        request_metrics.cache_hits += len(hits)
+        request_metrics.cache_misses += len(misses)
@@ -0,0 +1,69 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Замер в свежем интерпретаторе: время импорта yatube.wsgi, то есть
+# django.setup() и загрузки middleware, и загруженные модули.
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import yatube.wsgi
+print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))
+'''
+
+
+def measure(settings_module):
+    """Секунды импорта wsgi.application и имена загруженных модулей."""
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise CommandError(
+            f'Импорт yatube.wsgi с {settings_module} упал:\n{result.stderr}'
+        )
+    seconds, modules = json.loads(result.stdout)
+    return seconds, modules
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время импорта wsgi.application в свежем процессе '
+        '(загрузка воркера) и сверяет медиану с бюджетом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', default='yatube.settings_production',
+            help='Профиль настроек воркера'
+        )
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--budget', type=float, default=1.0,
+            help='Допустимая медиана, секунд'
+        )
+
+    def handle(self, *args, **options):
+        runs = [
+            measure(options['settings_module'])
+            for _ in range(options['runs'])
+        ]
+        median = statistics.median(seconds for seconds, _ in runs)
+        self.stdout.write(
+            f'{options["settings_module"]}: медиана {median * 1000:.0f} мс, '
+            f'от {min(runs)[0] * 1000:.0f} до {max(runs)[0] * 1000:.0f} мс, '
+            f'модулей {len(runs[0][1])}'
+        )
+        if median > options['budget']:
+            raise CommandError(
+                f'Импорт wsgi.application дольше бюджета '
+                f'{options["budget"] * 1000:.0f} мс'
+            )
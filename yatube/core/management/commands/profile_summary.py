@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import dump_name, hottest, read_stacks
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка самых горячих функций по стекам, '
+        'которые собрал ProfilerMiddleware'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=settings.PROFILER_DIR,
+            help='Каталог с файлами .collapsed'
+        )
+        parser.add_argument(
+            '--view', help='Только этот вид, например posts:post_detail'
+        )
+        parser.add_argument('--limit', type=int, default=15)
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['dir']):
+            raise CommandError(f'Нет каталога {options["dir"]}')
+        views = read_stacks(options['dir'])
+        if options['view']:
+            name = dump_name(options['view'])
+            views = {name: views[name]} if name in views else {}
+        if not views:
+            raise CommandError('Стеков не найдено')
+        for view, stacks in views.items():
+            samples = sum(stacks.values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{view}: {samples} отсчётов'
+            ))
+            self.stdout.write(f'{"своё":>7}{"всего":>7}  функция')
+            for frame, own, total in hottest(stacks, options['limit']):
+                self.stdout.write(
+                    f'{own / samples:>7.1%}{total / samples:>7.1%}  {frame}'
+                )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import get_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Медленные запросы к базе по форме запроса: число, время, вид '
+        'и план худшего случая'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--clear', action='store_true', help='Очистить отчёт'
+        )
+
+    def handle(self, *args, **options):
+        report = get_report()
+        if options['clear']:
+            report.clear()
+            self.stdout.write('Отчёт очищен')
+            return
+        entries = report.entries(options['limit'])
+        if not entries:
+            self.stdout.write('Медленных запросов нет')
+            return
+        for entry in entries:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{entry["count"]} раз, всего {entry["total_ms"]:.0f} мс, '
+                f'в среднем {entry["total_ms"] / entry["count"]:.1f} мс, '
+                f'худший {entry["max_ms"]:.1f} мс, вид {entry["view"]}'
+            ))
+            self.stdout.write(entry['sql'])
+            self.stdout.write(f'Параметры: {entry["params"]}')
+            if entry['plan']:
+                self.stdout.write(entry['plan'])
+            self.stdout.write('')
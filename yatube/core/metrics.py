@@ -0,0 +1,375 @@
+"""Метрики приложения для Prometheus: вид /metrics в текстовом формате.
+
+Каждый процесс копит счётчики и гистограммы в памяти и не чаще раза
+в METRICS_FLUSH_INTERVAL секунд сбрасывает их фоновым таймером в свой
+файл <pid>.json в каталоге METRICS_DIR, так что запрос за запись не
+платит. /metrics складывает файлы всех воркеров машины: счётчики и
+гистограммы суммируются, в том числе у завершившихся процессов, а
+значения (gauge) берутся только у живых. Без METRICS_DIR отдаются
+метрики одного текущего процесса (runserver).
+
+Запросы к базе считаются только в доле запросов, которую замеряет
+ServerTimingMiddleware (SERVER_TIMING_SAMPLE_RATE), вместе с числом
+таких запросов.
+
+Отдаются метрики по заголовку Authorization: Bearer METRICS_TOKEN
+или сотрудникам; без METRICS_TOKEN — только сотрудникам.
+
+Каталог стоит очищать при перезапуске сервиса (хук on_starting
+gunicorn): суммы верны и без этого, но файлы старых процессов копятся.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .budgets import budget_exceeded
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+FILE_SUFFIX = '.json'
+
+
+class Registry:
+    """Метрики процесса: {(имя, значения меток): число или корзины}.
+
+    У гистограммы значение — список отсчётов по корзинам (последняя —
+    +Inf) и сумма наблюдений в конце.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._values = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._timer = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def _forked(self):
+        # После fork значения родителя уже учтены в его файле.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = {}
+            self._timer = None
+
+    def add(self, name, labels, amount):
+        with self._lock:
+            self._forked()
+            key = (name, labels)
+            self._values[key] = self._values.get(key, 0) + amount
+            self._schedule()
+
+    def observe(self, name, labels, buckets, value):
+        with self._lock:
+            self._forked()
+            key = (name, labels)
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(buckets) + 2)
+            index = next(
+                (index for index, bound in enumerate(buckets)
+                 if value <= bound),
+                len(buckets)
+            )
+            counts[index] += 1
+            counts[-1] += value
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None and settings.METRICS_DIR:
+            self._timer = threading.Timer(
+                settings.METRICS_FLUSH_INTERVAL, self.flush
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def snapshot(self):
+        """Значения процесса и его gauge на этот момент."""
+        with self._lock:
+            self._forked()
+            self._timer = None
+            samples = [
+                [name, list(labels),
+                 list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self._values.items()
+            ]
+        gauges = {
+            metric.name: metric.function()
+            for metric in self.metrics.values() if metric.kind == 'gauge'
+        }
+        return {'pid': self._pid, 'samples': samples, 'gauges': gauges}
+
+    def flush(self):
+        """Пишет значения процесса в его файл в METRICS_DIR."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            with self._lock:
+                self._timer = None
+            return
+        snapshot = self.snapshot()
+        path = os.path.join(directory, f'{snapshot["pid"]}{FILE_SUFFIX}')
+        # Таймер и /metrics могут писать одновременно: у каждого потока
+        # свой временный файл, а замена файла атомарна.
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temporary, 'w') as dump:
+                json.dump(snapshot, dump)
+            os.replace(temporary, path)
+        except OSError:
+            logger.exception('Не удалось записать метрики в %s', path)
+
+    def collect(self):
+        """Снимки всех процессов машины или только текущего."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(FILE_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as dump:
+                    snapshot = json.load(dump)
+            except (OSError, ValueError):
+                continue
+            if not _alive(snapshot['pid']):
+                snapshot['gauges'] = {}
+            snapshots.append(snapshot)
+        return snapshots
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, _values(self, labels), amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        registry.observe(
+            self.name, _values(self, labels), self.buckets, value
+        )
+
+
+class Gauge:
+    """Значение, которое процесс сообщает при сбросе: function()."""
+    kind = 'gauge'
+    labels = ()
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        registry.register(self)
+
+
+def _values(metric, labels):
+    return tuple(str(labels[label]) for label in metric.labels)
+
+
+def _escape(value):
+    return (
+        value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    )
+
+
+def _series(name, names, values):
+    if not names:
+        return name
+    labels = ','.join(
+        f'{label}="{_escape(value)}"' for label, value in zip(names, values)
+    )
+    return f'{name}{{{labels}}}'
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def _merge(snapshots):
+    totals = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['samples']:
+            metric = registry.metrics.get(name)
+            if metric is None:
+                continue
+            key = (name, tuple(labels))
+            if metric.kind == 'histogram':
+                # Корзины могли поменяться между выкладками.
+                if len(value) != len(metric.buckets) + 2:
+                    continue
+                total = totals.setdefault(key, [0] * len(value))
+                for index, count in enumerate(value):
+                    total[index] += count
+            else:
+                totals[key] = totals.get(key, 0) + value
+        for name, value in snapshot['gauges'].items():
+            gauges[name] = gauges.get(name, 0) + value
+    return totals, gauges
+
+
+def render(snapshots):
+    """Текстовый формат Prometheus 0.0.4 для суммы снимков."""
+    totals, gauges = _merge(snapshots)
+    lines = []
+    for name, metric in sorted(registry.metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        if metric.kind == 'gauge':
+            lines.append(f'{name} {_number(gauges.get(name, 0))}')
+            continue
+        series = sorted(
+            (labels, value) for (key, labels), value in totals.items()
+            if key == name
+        )
+        for labels, value in series:
+            if metric.kind == 'counter':
+                lines.append(
+                    f'{_series(name, metric.labels, labels)} {_number(value)}'
+                )
+                continue
+            names = metric.labels + ('le',)
+            cumulative = 0
+            bounds = [_number(bound) for bound in metric.buckets] + ['+Inf']
+            for bound, count in zip(bounds, value):
+                cumulative += count
+                lines.append(
+                    f'{_series(f"{name}_bucket", names, labels + (bound,))} '
+                    f'{_number(cumulative)}'
+                )
+            lines.append(
+                f'{_series(f"{name}_sum", metric.labels, labels)} '
+                f'{_number(value[-1])}'
+            )
+            lines.append(
+                f'{_series(f"{name}_count", metric.labels, labels)} '
+                f'{_number(cumulative)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса по имени URL',
+    labels=('url_name', 'method'),
+)
+REQUESTS = Counter(
+    'yatube_requests_total',
+    'Запросы по имени URL и статусу ответа',
+    labels=('url_name', 'status'),
+)
+SAMPLED_REQUESTS = Counter(
+    'yatube_sampled_requests_total',
+    'Запросы, замеренные ServerTimingMiddleware, по имени URL',
+    labels=('url_name',),
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total',
+    'Запросы к базе в замеренных запросах по имени URL',
+    labels=('url_name',),
+)
+DB_SECONDS = Counter(
+    'yatube_db_query_seconds_total',
+    'Время запросов к базе в замеренных запросах по имени URL',
+    labels=('url_name',),
+)
+CACHE_LOOKUPS = Counter(
+    'yatube_cache_lookups_total',
+    'Обращения к кэшу по кэшам из METRICS_CACHES: попадания и промахи',
+    labels=('cache', 'result'),
+)
+BUDGETS_EXCEEDED = Counter(
+    'yatube_query_budget_exceeded_total',
+    'Превышения бюджета запросов вида (core.budgets)',
+    labels=('view',),
+)
+
+
+def observe_request(url_name, method, status, seconds):
+    url_name = url_name or 'unresolved'
+    if method not in METHODS:
+        method = 'other'
+    REQUEST_SECONDS.observe(seconds, url_name=url_name, method=method)
+    REQUESTS.inc(url_name=url_name, status=status)
+
+
+def observe_sample(url_name, request_metrics):
+    """Запросы к базе одного замеренного запроса.
+
+    Замеряется только доля SERVER_TIMING_SAMPLE_RATE запросов, поэтому
+    среднее на запрос — DB_QUERIES, делённое на SAMPLED_REQUESTS.
+    """
+    url_name = url_name or 'unresolved'
+    SAMPLED_REQUESTS.inc(url_name=url_name)
+    DB_QUERIES.inc(request_metrics.sql_count, url_name=url_name)
+    DB_SECONDS.inc(request_metrics.sql_time, url_name=url_name)
+
+
+def _cache_name(key):
+    for prefix, name in settings.METRICS_CACHES.items():
+        if str(key).startswith(prefix):
+            return name
+    return 'other'
+
+
+def cache_lookups(hits, misses):
+    """hits и misses — ключи, найденные и не найденные в кэше."""
+    lookups = collections.Counter(
+        (_cache_name(key), result)
+        for keys, result in ((hits, 'hit'), (misses, 'miss'))
+        for key in keys
+    )
+    for (cache, result), count in lookups.items():
+        CACHE_LOOKUPS.inc(count, cache=cache, result=result)
+
+
+@receiver(budget_exceeded)
+def count_budget_exceeded(sender, view, **kwargs):
+    BUDGETS_EXCEEDED.inc(view=view)
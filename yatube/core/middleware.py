@@ -0,0 +1,149 @@
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import instrumentation, metrics, profiling
+from core.slow_queries import SlowQueryLog
+
+logger = logging.getLogger(__name__)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class MetricsMiddleware:
+    """Время и статус каждого запроса для /metrics.
+
+    Выполнение SQL здесь не оборачивается: запросы к базе попадают
+    в метрики только из доли запросов, которую замеряет
+    ServerTimingMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        metrics.observe_request(
+            match.view_name if match else None,
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+        )
+        return response
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing и строка журнала для доли запросов.
+
+    Замеряется доля SERVER_TIMING_SAMPLE_RATE запросов: число и время
+    SQL, время рендеринга шаблонов, попадания и промахи кэша и общее
+    время обработки. Строка журнала — JSON с именем URL
+    (posts:index, posts:profile, …), по которому её удобно группировать.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with instrumentation.collect() as request_metrics:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{request_metrics.sql_count} queries";'
+            f'dur={_ms(request_metrics.sql_time)}',
+            f'tpl;dur={_ms(request_metrics.template_time)}',
+            f'cache;desc="{request_metrics.cache_hits} hits, '
+            f'{request_metrics.cache_misses} misses"',
+            f'view;dur={_ms(elapsed)}',
+        ))
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        metrics.observe_sample(url_name, request_metrics)
+        logger.info(json.dumps({
+            'url_name': url_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view_ms': _ms(elapsed),
+            'sql_count': request_metrics.sql_count,
+            'sql_ms': _ms(request_metrics.sql_time),
+            'template_ms': _ms(request_metrics.template_time),
+            'cache_hits': request_metrics.cache_hits,
+            'cache_misses': request_metrics.cache_misses,
+        }, ensure_ascii=False))
+        return response
+
+
+class ProfilerMiddleware:
+    """Профилирует запросы сэмплером стеков и пишет их по видам.
+
+    Профилируется доля PROFILER_SAMPLE_RATE запросов, все запросы к
+    именам URL из PROFILER_URL_NAMES и запросы сотрудников с заголовком
+    PROFILER_HEADER. Стоит после AuthenticationMiddleware. Имя URL
+    известно только после разрешения адреса, поэтому такие запросы
+    начинают профилироваться в process_view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampler = request._profiler = profiling.StackSampler(
+            settings.PROFILER_INTERVAL, root=sys._getframe()
+        )
+        if self.should_profile(request):
+            sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        if sampler.stacks:
+            match = request.resolver_match
+            profiling.write_stacks(
+                settings.PROFILER_DIR,
+                match.view_name if match else None,
+                sampler.stacks,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match and match.view_name in settings.PROFILER_URL_NAMES:
+            request._profiler.start()
+
+    def should_profile(self, request):
+        if random.random() < settings.PROFILER_SAMPLE_RATE:
+            return True
+        return (
+            settings.PROFILER_HEADER in request.headers
+            and request.user.is_staff
+        )
+
+
+class SlowQueryMiddleware:
+    """Отмечает запросы к базе дольше SLOW_QUERY_MS (core.slow_queries)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_MS is None:
+            return self.get_response(request)
+        log = SlowQueryLog(request, settings.SLOW_QUERY_MS)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            return self.get_response(request)
@@ -0,0 +1,179 @@
+"""Выборочное профилирование запросов сэмплером стеков.
+
+StackSampler раз в interval секунд снимает стек профилируемого
+потока. В отличие от cProfile, он видит стек целиком, поэтому
+результат — готовые строки collapsed-формата («кадр;кадр;кадр число»),
+которые принимают flamegraph.pl и speedscope, а накладные расходы
+почти не зависят от числа вызовов функций.
+
+В главном потоке (воркеры gunicorn sync) отсчёты приходят сигналом
+таймера ITIMER_REAL: обработчик получает именно тот кадр, на котором
+прерван код. Прежние обработчик SIGALRM и таймер (alarm, setitimer)
+сохраняются и восстанавливаются, когда сэмплер останавливается; время
+таймера, прошедшее за запрос, учитывается.
+
+В остальных потоках стек снимает отдельный поток через
+sys._current_frames(); он получает GIL в основном там, где код сам его
+отпускает (ввод-вывод), и такие места в профиле преувеличены.
+
+Стеки каждого запроса дописываются в каталог PROFILER_DIR, в файл
+вида по имени URL, например posts.post_detail.<pid>.collapsed. У
+каждого процесса свой файл, так что воркеры не перемешивают строки;
+повторы одного стека суммируются при чтении.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+COLLAPSED_SUFFIX = '.collapsed'
+
+
+def _label(code, module):
+    # co_qualname появился в Python 3.11.
+    return f'{module}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+class StackSampler:
+    """Снимает стеки текущего потока между start() и stop() или, что
+    то же, пока открыт with.
+
+    Кадры выше root (по умолчанию — кадра, вызвавшего start или
+    открывшего with) общие у всех запросов (сервер, обработчик Django)
+    и в стеки не попадают.
+    """
+
+    def __init__(self, interval, root=None):
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = False
+        self._root = root
+        self._thread = None
+
+    def __enter__(self):
+        self.start(sys._getframe(1))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self, root=None):
+        if self.started:
+            return
+        self.started = True
+        if self._root is None:
+            self._root = root or sys._getframe(1)
+        self._last = time.perf_counter()
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGALRM, self._on_signal)
+            self._previous_timer = signal.setitimer(
+                signal.ITIMER_REAL, self.interval, self.interval
+            )
+            self._started_at = self._last
+        else:
+            self._thread_id = threading.get_ident()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        if self._thread is None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous)
+            delay, interval = self._previous_timer
+            if delay:
+                elapsed = time.perf_counter() - self._started_at
+                # Истёкший за время запроса таймер срабатывает сразу.
+                delay = max(delay - elapsed, 1e-6)
+                signal.setitimer(signal.ITIMER_REAL, delay, interval)
+        else:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _on_signal(self, signum, frame):
+        self._sample(frame)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample(sys._current_frames().get(self._thread_id))
+
+    def _sample(self, frame):
+        # Отсчёт может опоздать (сигналы склеиваются, пока идёт долгий
+        # вызов C), поэтому стек весит время с прошлого отсчёта.
+        now = time.perf_counter()
+        weight = max(round((now - self._last) / self.interval), 1)
+        self._last = now
+        stack = []
+        code = None
+        while frame is not None and frame is not self._root:
+            code = frame.f_code
+            stack.append(_label(code, frame.f_globals.get('__name__', '?')))
+            frame = frame.f_back
+        # Поток ещё в __enter__ или уже в __exit__ самого сэмплера.
+        if frame is self._root and code not in _OWN_CODE:
+            self.stacks[';'.join(reversed(stack))] += weight
+
+
+_OWN_CODE = (
+    None,
+    StackSampler.__enter__.__code__, StackSampler.__exit__.__code__,
+    StackSampler.start.__code__, StackSampler.stop.__code__,
+)
+
+
+def dump_name(view_name):
+    """Имя файла стеков для имени URL: posts:index → posts.index."""
+    return (view_name or 'unresolved').replace(':', '.')
+
+
+def write_stacks(directory, view_name, stacks):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f'{dump_name(view_name)}.{os.getpid()}{COLLAPSED_SUFFIX}'
+    )
+    with open(path, 'a') as dump:
+        dump.writelines(
+            f'{stack} {count}\n' for stack, count in stacks.items()
+        )
+
+
+def read_stacks(directory):
+    """Стеки всех файлов каталога: {вид: Counter(стек → отсчёты)}."""
+    views = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(COLLAPSED_SUFFIX):
+            continue
+        view = name[:-len(COLLAPSED_SUFFIX)].rsplit('.', 1)[0]
+        stacks = views.setdefault(view, Counter())
+        with open(os.path.join(directory, name)) as dump:
+            for line in dump:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return views
+
+
+def hottest(stacks, limit):
+    """Самые горячие функции: [(функция, собственные, суммарные)].
+
+    Собственные отсчёты — функция на вершине стека, суммарные — где
+    угодно в стеке (рекурсия учитывается один раз).
+    """
+    own = Counter()
+    total = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    rows = sorted(
+        ((frame, own[frame], total[frame]) for frame in total),
+        key=lambda row: (-row[1], -row[2], row[0]),
+    )
+    return rows[:limit]
@@ -0,0 +1,193 @@
+"""Журнал медленных запросов к базе с планом выполнения.
+
+core.middleware.SlowQueryMiddleware на время запроса ставит
+SlowQueryLog через connection.execute_wrapper. Запрос дольше
+SLOW_QUERY_MS миллисекунд пишется в журнал core.slow_queries вместе
+с параметрами, именем URL вида и выводом EXPLAIN QUERY PLAN (только
+для SELECT: у других баз EXPLAIN может выполнить изменяющий запрос).
+
+Запросы одной формы — с точностью до чисел и длины списков IN и
+VALUES — сводятся в одну строку отчёта: число, суммарное и худшее
+время, параметры и план худшего случая. Отчёт хранится в отдельном
+файле SQLite (SLOW_QUERY_REPORT), общем для всех воркеров, и
+показывается командой slow_queries; строки, не встречавшиеся дольше
+SLOW_QUERY_WINDOW секунд, из него выпадают.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS slow_query (
+    shape TEXT PRIMARY KEY,
+    sql TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total_ms REAL NOT NULL,
+    max_ms REAL NOT NULL,
+    view TEXT,
+    params TEXT,
+    plan TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slow_query_last_seen ON slow_query (last_seen);
+'''
+
+UPSERT = '''
+INSERT INTO slow_query (
+    shape, sql, count, total_ms, max_ms, view, params, plan,
+    first_seen, last_seen
+)
+VALUES (:shape, :sql, 1, :ms, :ms, :view, :params, :plan, :now, :now)
+ON CONFLICT (shape) DO UPDATE SET
+    count = count + 1,
+    total_ms = total_ms + excluded.total_ms,
+    last_seen = excluded.last_seen,
+    sql = CASE WHEN excluded.max_ms > max_ms THEN excluded.sql ELSE sql END,
+    view = CASE WHEN excluded.max_ms > max_ms THEN excluded.view ELSE view END,
+    params = CASE WHEN excluded.max_ms > max_ms
+        THEN excluded.params ELSE params END,
+    plan = CASE WHEN excluded.max_ms > max_ms THEN excluded.plan ELSE plan END,
+    max_ms = MAX(max_ms, excluded.max_ms)
+'''
+
+_VALUES_GROUPS = re.compile(r'(\(%s(?:, %s)*\))(?:, \1)+')
+_IN_LIST = re.compile(r'IN \(%s(?:, %s)+\)')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def statement_shape(sql):
+    """Форма запроса: числа и длина списков IN и VALUES не важны."""
+    sql = _VALUES_GROUPS.sub(r'\1, …', sql)
+    sql = _IN_LIST.sub('IN (%s, …)', sql)
+    return _NUMBER.sub('N', sql)
+
+
+class SlowQueryReport:
+    """Сводка медленных запросов в файле SQLite, общем для процессов."""
+
+    def __init__(self, path, window):
+        self.path = path
+        self.window = window
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, sql, params, ms, view, plan):
+        now = time.time()
+        shape = statement_shape(sql)
+        conn = self._connection()
+        conn.execute(UPSERT, {
+            'shape': hashlib.sha1(shape.encode()).hexdigest(),
+            'sql': sql,
+            'ms': ms,
+            'view': view,
+            'params': repr(params),
+            'plan': plan,
+            'now': now,
+        })
+        conn.execute(
+            'DELETE FROM slow_query WHERE last_seen < ?',
+            (now - self.window,)
+        )
+
+    def entries(self, limit=None):
+        """Строки отчёта от наибольшего суммарного времени."""
+        return self._connection().execute(
+            'SELECT * FROM slow_query WHERE last_seen >= ? '
+            'ORDER BY total_ms DESC LIMIT ?',
+            (time.time() - self.window, -1 if limit is None else limit)
+        ).fetchall()
+
+    def clear(self):
+        self._connection().execute('DELETE FROM slow_query')
+
+
+_reports = {}
+
+
+def get_report():
+    key = (settings.SLOW_QUERY_REPORT, settings.SLOW_QUERY_WINDOW)
+    if key not in _reports:
+        _reports[key] = SlowQueryReport(*key)
+    return _reports[key]
+
+
+def explain(connection, sql, params):
+    """План запроса строками с отступами по вложенности."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = connection.ops.explain_query_prefix()
+    # Курсор драйвера в обход execute_wrapper: EXPLAIN не должен
+    # попадать ни в замеры, ни в бюджеты запросов вида.
+    with connection.cursor() as wrapper:
+        cursor = wrapper.cursor
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    if connection.vendor != 'sqlite':
+        return '\n'.join(str(row[0]) for row in rows)
+    # SQLite: (id, parent, notused, detail), дерево по parent.
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+class SlowQueryLog:
+    """execute_wrapper: отмечает запросы дольше threshold_ms."""
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold_ms = threshold_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if ms >= self.threshold_ms and not many:
+                self._report(context['connection'], sql, params, ms)
+
+    def _report(self, connection, sql, params, ms):
+        try:
+            plan = explain(connection, sql, params)
+        except Exception as error:
+            # Запрос мог оставить транзакцию в ошибке; план не важнее.
+            plan = f'EXPLAIN не удался: {error}'
+        match = self.request.resolver_match
+        view = match.view_name if match else None
+        logger.warning(json.dumps({
+            'view': view,
+            'ms': round(ms, 2),
+            'sql': sql,
+            'params': repr(params),
+            'plan': plan,
+        }, ensure_ascii=False))
+        try:
+            get_report().record(sql, params, ms, view, plan)
+        except sqlite3.Error:
+            logger.exception('Не удалось записать отчёт о медленных запросах')
@@ -0,0 +1,25 @@
+"""Шаблоны Django с учётом времени рендеринга в замере запроса.
+
+    TEMPLATES = [{
+        'BACKEND': 'core.template_backends.timed.TimedDjangoTemplates',
+        ...
+    }]
+"""
+from django.template.backends.django import DjangoTemplates, Template
+
+from core.instrumentation import measure_template
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with measure_template():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
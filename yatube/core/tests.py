@@ -1,4 +1,33 @@
-from django.test import TestCase
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import sys
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished, request_started
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import (budgets, deferred, instrumentation, metrics, profiling,
+               slow_queries)
+from .cache_backends.sqlite import SQLiteCache
+from .management.commands import benchmark_startup
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +35,644 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def request(self, url):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage()), queries
+
+    def test_sampled_request(self):
+        """Замер попадает в заголовок и в строку журнала с именем URL."""
+        response, record, queries = self.request(reverse('posts:index'))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'view;dur=[\d.]+')
+        self.assertEqual(record['url_name'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['sql_count'], len(queries))
+        self.assertIn(f'db;desc="{len(queries)} queries"', header)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertLessEqual(record['template_ms'], record['view_ms'])
+
+    def test_cache_hits(self):
+        self.request(reverse('posts:index'))
+        response, record, _ = self.request(reverse('posts:index'))
+        self.assertGreater(record['cache_hits'], 0)
+        self.assertIn(
+            f'{record["cache_hits"]} hits', response['Server-Timing']
+        )
+
+    def test_unresolved_url(self):
+        response, record, _ = self.request('/nonexist-page/')
+        self.assertEqual(record['status'], 404)
+        self.assertIsNone(record['url_name'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        with self.assertNoLogs('core.middleware', 'INFO'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@budgets.query_budget(queries=1)
+def _two_queries(request):
+    User.objects.count()
+    User.objects.filter(username='nobody').exists()
+    return 'ответ'
+
+
+@budgets.query_budget(queries=1)
+def _two_queries_named(request, username):
+    User.objects.filter(username=username).exists()
+    User.objects.filter(username=username).exists()
+    return 'ответ'
+
+
+@budgets.query_budget(queries=5, sql_ms=0)
+def _one_query(request):
+    User.objects.count()
+    return 'ответ'
+
+
+@budgets.query_budget(queries=lambda: _limit, sql_ms=1000)
+def _settings_budget(request):
+    User.objects.count()
+    User.objects.count()
+    return 'ответ'
+
+
+_limit = 1
+
+
+@budgets.query_budget(queries=1, sql_ms=1000)
+def _within_budget(request):
+    User.objects.count()
+    return 'ответ'
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+    def test_registry(self):
+        self.assertEqual(
+            budgets.BUDGETS['core.tests._two_queries'].queries, 1
+        )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_raises_with_sql(self):
+        with self.assertRaisesRegex(
+            budgets.QueryBudgetExceeded,
+            r'(?s)_two_queries: 2 запросов при бюджете 1.*'
+            r'1\. .*COUNT.*2\. .*nobody',
+        ):
+            _two_queries(self.request)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_warning_and_signal(self):
+        received = []
+
+        def receiver(sender, view, violations, queries, **kwargs):
+            received.append((view, violations))
+
+        budgets.budget_exceeded.connect(receiver)
+        self.addCleanup(budgets.budget_exceeded.disconnect, receiver)
+        with self.assertLogs('core.budgets', 'WARNING') as logs:
+            self.assertEqual(_one_query(self.request), 'ответ')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 1)
+        self.assertIn('COUNT', record['sql'][0]['sql'])
+        self.assertEqual(record['violations'][0][:4], 'SQL ')
+        self.assertEqual(received[0][0], 'core.tests._one_query')
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_callable_budget(self):
+        with self.assertRaises(budgets.QueryBudgetExceeded):
+            _settings_budget(self.request)
+        with mock.patch(f'{__name__}._limit', 2):
+            self.assertEqual(_settings_budget(self.request), 'ответ')
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_long_sql_is_shortened(self):
+        long_name = 'x' * 10000
+        with self.assertLogs('core.budgets', 'WARNING') as logs:
+            with override_settings(QUERY_BUDGET_STRICT=True):
+                with self.assertRaises(budgets.QueryBudgetExceeded) as error:
+                    _two_queries_named(self.request, long_name)
+            _two_queries_named(self.request, long_name)
+        self.assertLess(len(str(error.exception)), 3000)
+        record = json.loads(logs.records[0].getMessage())
+        for query in record['sql']:
+            self.assertLessEqual(
+                len(query['params']), budgets.REPORTED_SQL_CHARS + 30
+            )
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_within_budget(self):
+        with self.assertNoLogs('core.budgets', 'WARNING'):
+            _within_budget(self.request)
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            SLOW_QUERY_MS=0,
+            SLOW_QUERY_REPORT=os.path.join(directory.name, 'slow.sqlite3'),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def get(self, url):
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            self.client.get(url)
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            slow_queries.statement_shape(
+                'SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'
+            ),
+            'SELECT * FROM t WHERE id IN (%s, …) LIMIT N',
+        )
+        self.assertEqual(
+            slow_queries.statement_shape(
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'
+            ),
+            'INSERT INTO t (a, b) VALUES (%s, %s), …',
+        )
+
+    def test_logged_with_plan_and_view(self):
+        """Запрос попадает в журнал с планом, параметрами и видом."""
+        records = self.get(reverse('posts:index'))
+        select = next(
+            record for record in records if 'posts_post' in record['sql']
+        )
+        self.assertEqual(select['view'], 'posts:index')
+        self.assertIn('SCAN', select['plan'])
+        self.assertIsNotNone(select['params'])
+
+    def test_report_deduplicates_shapes(self):
+        """Одинаковые по форме запросы — одна строка отчёта."""
+        self.get(reverse('posts:index'))
+        cache.clear()
+        self.get(reverse('posts:index'))
+        entries = [
+            entry for entry in slow_queries.get_report().entries()
+            if 'posts_post' in entry['sql']
+        ]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['count'], 2)
+        self.assertEqual(entries[0]['view'], 'posts:index')
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('2 раз', out.getvalue())
+        self.assertIn('posts_post', out.getvalue())
+
+    def test_explain_not_counted_in_budget(self):
+        """EXPLAIN идёт мимо execute_wrapper и не тратит бюджет."""
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            self.get(reverse('posts:index'))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        with self.assertNoLogs('core.slow_queries', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+
+
+def _samples(text):
+    """Строки выдачи /metrics: {серия: значение}."""
+    return {
+        series: float(value)
+        for series, _, value in (
+            line.rpartition(' ') for line in text.splitlines()
+            if not line.startswith('#')
+        )
+    }
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(
+            METRICS_DIR=self.directory, METRICS_TOKEN='scrape-token'
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return _samples(response.content.decode())
+
+    def test_request_metrics(self):
+        """Запросы, время, запросы к базе и кэш лент по имени URL."""
+        before = self.scrape()
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=1), \
+                self.assertLogs('core.middleware', 'INFO'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+        samples = self.scrape()
+
+        def delta(series):
+            return samples.get(series, 0) - before.get(series, 0)
+
+        self.assertEqual(delta(
+            'yatube_requests_total{url_name="posts:index",status="200"}'
+        ), 2)
+        self.assertEqual(delta(
+            'yatube_request_duration_seconds_count'
+            '{url_name="posts:index",method="GET"}'
+        ), 2)
+        self.assertEqual(delta(
+            'yatube_request_duration_seconds_bucket'
+            '{url_name="posts:index",method="GET",le="+Inf"}'
+        ), 2)
+        self.assertEqual(
+            delta('yatube_sampled_requests_total{url_name="posts:index"}'), 2
+        )
+        self.assertGreaterEqual(
+            delta('yatube_db_queries_total{url_name="posts:index"}'),
+            len(queries),
+        )
+        self.assertEqual(delta(
+            'yatube_cache_lookups_total{cache="index_page",result="miss"}'
+        ), 1)
+        self.assertEqual(delta(
+            'yatube_cache_lookups_total{cache="index_page",result="hit"}'
+        ), 1)
+        self.assertIn('yatube_thumbnail_queue_depth', samples)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_do_not_wrap_sql(self):
+        before = self.scrape()
+        with mock.patch.object(
+            instrumentation, 'collect', wraps=instrumentation.collect
+        ) as collect:
+            self.client.get(reverse('posts:index'))
+        collect.assert_not_called()
+        samples = self.scrape()
+        series = 'yatube_requests_total{url_name="posts:index",status="200"}'
+        self.assertEqual(samples[series] - before.get(series, 0), 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        with override_settings(METRICS_DIR=None):
+            registry.observe('h', ('a',), (0.1, 1), 0.05)
+            registry.observe('h', ('a',), (0.1, 1), 0.5)
+            registry.observe('h', ('a',), (0.1, 1), 5)
+            snapshot = registry.snapshot()
+        self.assertEqual(snapshot['samples'], [['h', ['a'], [1, 1, 1, 5.55]]])
+
+    def test_aggregates_worker_files(self):
+        """Счётчики суммируются по всем файлам, gauge — по живым."""
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        for pid, requests, queue in ((os.getppid(), 4, 3), (dead.pid, 1, 5)):
+            path = os.path.join(self.directory, f'{pid}.json')
+            with open(path, 'w') as dump:
+                json.dump({
+                    'pid': pid,
+                    'samples': [[
+                        'yatube_requests_total', ['worker', '200'], requests
+                    ]],
+                    'gauges': {'yatube_thumbnail_queue_depth': queue},
+                }, dump)
+        samples = self.scrape()
+        self.assertEqual(samples[
+            'yatube_requests_total{url_name="worker",status="200"}'
+        ], 5)
+        self.assertEqual(samples['yatube_thumbnail_queue_depth'], 3)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, f'{os.getpid()}.json')
+        ))
+
+    def test_budget_exceeded_counted(self):
+        series = 'yatube_query_budget_exceeded_total{view="v"}'
+        before = _samples(metrics.render([metrics.registry.snapshot()]))
+        budgets.budget_exceeded.send(
+            sender=None, view='v', violations=[], queries=[]
+        )
+        after = _samples(metrics.render([metrics.registry.snapshot()]))
+        self.assertEqual(after[series] - before.get(series, 0), 1)
+
+    def test_token_or_staff_only(self):
+        """Адрес клиента ничего не решает: нужен токен или сотрудник."""
+        for headers in (
+            {'REMOTE_ADDR': '127.0.0.1'},
+            {'HTTP_AUTHORIZATION': 'Bearer wrong-token'},
+            {'HTTP_AUTHORIZATION': 'Basic scrape-token'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=None):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer '
+            )
+            self.assertEqual(response.status_code, 404)
+            staff = User.objects.create_user(username='staff', is_staff=True)
+            self.client.force_login(staff)
+            response = self.client.get(reverse('metrics'))
+            self.assertEqual(response.status_code, 200)
+
+
+class DeferredTests(SimpleTestCase):
+    def test_runs_after_response(self):
+        calls = []
+        request_started.send(sender=None)
+        deferred.after_response(calls.append, 'после ответа')
+        self.assertEqual(calls, [])
+        request_finished.send(sender=None)
+        self.assertEqual(calls, ['после ответа'])
+
+    def test_runs_at_once_outside_request(self):
+        calls = []
+        deferred.after_response(calls.append, 'сразу')
+        self.assertEqual(calls, ['сразу'])
+
+    def test_error_is_logged(self):
+        calls = []
+        request_started.send(sender=None)
+        deferred.after_response(int, 'не число')
+        deferred.after_response(calls.append, 'следующий')
+        with self.assertLogs('core.deferred', 'ERROR'):
+            request_finished.send(sender=None)
+        self.assertEqual(calls, ['следующий'])
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def profile(self, **options):
+        settings = {
+            'PROFILER_DIR': self.directory,
+            'PROFILER_INTERVAL': 0.0001,
+            'PROFILER_SAMPLE_RATE': 0,
+            'PROFILER_URL_NAMES': (),
+            **options,
+        }
+        return override_settings(**settings)
+
+    def sample(self):
+        with profiling.StackSampler(0.0005) as sampler:
+            _busy(0.05)
+        return sampler.stacks
+
+    def test_sampler_collapsed_stacks(self):
+        """Стеки начинаются ниже места, где открыт сэмплер."""
+        stacks = self.sample()
+        self.assertTrue(stacks)
+        for stack in stacks:
+            self.assertTrue(stack.startswith('core.tests:_busy'), stack)
+        self.assertAlmostEqual(sum(stacks.values()), 100, delta=30)
+
+    def test_sampler_in_thread(self):
+        """Вне главного потока стеки снимает поток-сэмплер."""
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.update(stacks=self.sample())
+        )
+        worker.start()
+        worker.join()
+        self.assertTrue(result['stacks'])
+        for stack in result['stacks']:
+            self.assertTrue(stack.startswith('core.tests:_busy'), stack)
+
+    def test_restores_previous_alarm(self):
+        """Чужие обработчик SIGALRM и таймер переживают профилирование,
+        а истёкший за это время таймер срабатывает сразу после."""
+        fired = []
+
+        def handler(signum, frame):
+            fired.append(signum)
+
+        previous = signal.signal(signal.SIGALRM, handler)
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        self.addCleanup(signal.setitimer, signal.ITIMER_REAL, 0)
+        signal.setitimer(signal.ITIMER_REAL, 10)
+        self.sample()
+        self.assertIs(signal.getsignal(signal.SIGALRM), handler)
+        delay, _ = signal.getitimer(signal.ITIMER_REAL)
+        self.assertTrue(9 < delay < 10, delay)
+        signal.setitimer(signal.ITIMER_REAL, 0.01)
+        self.sample()
+        _busy(0.01)
+        self.assertEqual(fired, [signal.SIGALRM])
+
+    def test_label_without_qualname(self):
+        """co_qualname есть только с Python 3.11."""
+        code = mock.Mock(spec=['co_name'], co_name='view')
+        self.assertEqual(profiling._label(code, 'posts.views'),
+                         'posts.views:view')
+
+    def test_hottest(self):
+        stacks = {'a;b;c': 3, 'a;b': 1, 'a;d': 2}
+        self.assertEqual(
+            profiling.hottest(stacks, 3),
+            [('c', 3, 3), ('d', 2, 2), ('b', 1, 4)],
+        )
+
+    def test_url_name(self):
+        """Запросы к перечисленным именам URL профилируются всегда."""
+        with self.profile(PROFILER_URL_NAMES=('posts:index',)):
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('about:author'))
+        names = os.listdir(self.directory)
+        self.assertTrue(names)
+        self.assertTrue(all(name.startswith('posts.index.') for name in names))
+
+    def test_header_for_staff_only(self):
+        with self.profile():
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+            self.assertEqual(os.listdir(self.directory), [])
+            self.client.force_login(self.staff)
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        self.assertTrue(os.listdir(self.directory))
+
+    def test_summary_command(self):
+        profiling.write_stacks(
+            self.directory, 'posts:post_detail', {'a;b': 3, 'a;c': 1}
+        )
+        profiling.write_stacks(self.directory, 'posts:index', {'a;b': 1})
+        profiling.write_stacks(
+            self.directory, 'posts:post_detail', {'a;b': 1}
+        )
+        out = StringIO()
+        call_command(
+            'profile_summary', dir=self.directory, view='posts:post_detail',
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('posts.post_detail: 5 отсчётов', output)
+        self.assertRegex(output, r'80.0% +80.0%  b')
+        self.assertNotIn('posts.index', output)
+
+
+def _incr_many(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite3')
+        self.cache = self._cache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_shared_between_instances(self):
+        """Записи одного экземпляра видны другому через файл."""
+        self._cache().set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': 'value'})
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 1, timeout=0.05))
+        self.assertFalse(self.cache.add('key', 2))
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 3))
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_incr_and_versions(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.incr('key', 5), 6)
+        self.assertEqual(self.cache.decr('key'), 5)
+        self.cache.incr_version('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', version=2), 5)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_incr_many, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_eviction_by_entries(self):
+        cache = self._cache(MAX_ENTRIES=3, ACCESS_RESOLUTION=0)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('d'), 'd')
+
+    def test_eviction_by_size(self):
+        cache = self._cache(MAX_SIZE=4096)
+        for number in range(10):
+            cache.set(number, b'x' * 1000)
+        stored = cache.get_many(range(10))
+        self.assertLessEqual(len(stored), 4)
+        self.assertIn(9, stored)
+
+    def test_clear(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        environ = mock.patch.dict(os.environ, {
+            'YATUBE_SECRET_KEY': 'test',
+            'YATUBE_STATE_DIR': directory.name,
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def load(self):
+        sys.modules.pop('yatube.settings_production', None)
+        self.addCleanup(sys.modules.pop, 'yatube.settings_production', None)
+        return importlib.import_module('yatube.settings_production')
+
+    def test_profile(self):
+        production = self.load()
+        self.assertFalse(production.DEBUG)
+        self.assertFalse(production.QUERY_BUDGET_STRICT)
+        self.assertNotIn('debug_toolbar', production.INSTALLED_APPS)
+        self.assertFalse(any(
+            'debug_toolbar' in middleware
+            for middleware in production.MIDDLEWARE
+        ))
+        self.assertGreater(production.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertTrue(production.METRICS_DIR.startswith(
+            os.environ['YATUBE_STATE_DIR']
+        ))
+
+    def test_secret_key_required(self):
+        del os.environ['YATUBE_SECRET_KEY']
+        with self.assertRaises(ImproperlyConfigured):
+            self.load()
+
+    def test_wsgi_imports_no_debug_modules(self):
+        """Воркер с боевыми настройками не загружает отладочные модули."""
+        _, modules = benchmark_startup.measure('yatube.settings_production')
+        self.assertIn('yatube.wsgi', modules)
+        self.assertFalse([
+            name for name in modules if name.startswith('debug_toolbar')
+        ])
+
+    @skipUnless(
+        os.environ.get('YATUBE_STARTUP_BENCHMARK'),
+        'замер времени: YATUBE_STARTUP_BENCHMARK=1'
+    )
+    def test_wsgi_import_within_budget(self):
+        """Воркер с боевыми настройками загружается быстрее бюджета."""
+        out = StringIO()
+        call_command('benchmark_startup', runs=3, stdout=out)
+        self.assertIn('yatube.settings_production', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('benchmark_startup', runs=1, budget=0, stdout=out)
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from core import metrics as app_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,24 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, value = header.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(
+        value.strip().encode(), token.encode()
+    )
+
+
+def metrics(request):
+    """Метрики для Prometheus по METRICS_TOKEN и для сотрудников."""
+    if not _has_metrics_token(request) and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(
+        app_metrics.render(app_metrics.registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post, Comment
+from .search import match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,6 +11,13 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через индекс FTS5, а не LIKE '%...%'.
+        expression = match_expression(search_term)
+        if expression is None:
+            return queryset, False
+        return queryset.filter(pk__in=matching_ids(expression)), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('author', 'email', 'post', 'created',)
@@ -0,0 +1,163 @@
+"""JSON API только для чтения для мобильного клиента.
+
+Ленты отдаются теми же запросами и паджинаторами, что и HTML-страницы,
+поэтому страница стоит фиксированное число запросов. Параметр fields
+ограничивает набор полей (?fields=id,text,author), а миниатюры читаются
+из хранилища, только если поле thumbnail запрошено.
+"""
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from core.budgets import query_budget
+
+from . import feeds
+from .caching import conditional_page
+from .models import Group, Post
+from .thumbnails import prefetch_thumbnails, ready_thumbnail
+from .utils import comments_page, paginator
+
+User = get_user_model()
+
+THUMBNAIL_SIZE = 'card'
+# Чтение хранилища sorl для миниатюр страницы, если их нет в кэше.
+THUMBNAIL_QUERIES = 1
+
+POST_FIELDS = {
+    'id': lambda post: post.id,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'author': lambda post: post.author.username,
+    'author_name': lambda post: post.author.get_full_name(),
+    'group': lambda post: post.group.slug if post.group else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'thumbnail': lambda post: _thumbnail_url(post),
+    'comments_count': lambda post: post.comments_count,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.id,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created,
+}
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _thumbnail_url(post):
+    thumbnail = ready_thumbnail(post.image, THUMBNAIL_SIZE)
+    return thumbnail.url if thumbnail else None
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def _selected_fields(request, available):
+    """Поля из ?fields=a,b в порядке available; без параметра — все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(available)
+    if unknown:
+        raise InvalidFields(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown))
+        )
+    return [name for name in available if name in requested]
+
+
+def _serialize(objects, fields, available):
+    return [
+        {name: available[name](obj) for name in fields} for obj in objects
+    ]
+
+
+def _post_page(request, page_obj):
+    fields = _selected_fields(request, POST_FIELDS)
+    if 'thumbnail' in fields:
+        prefetch_thumbnails(page_obj, THUMBNAIL_SIZE)
+    return _page(page_obj, _serialize(page_obj, fields, POST_FIELDS))
+
+
+def _page(page_obj, results):
+    return _json({
+        'results': results,
+        'next_cursor': page_obj.next_cursor,
+        'previous_cursor': page_obj.previous_cursor,
+    })
+
+
+def api_view(login_required=False):
+    """GET-вид API: ошибки отдаются JSON, а не HTML-страницами сайта."""
+    def decorator(view):
+        @require_GET
+        @conditional_page
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if login_required and not request.user.is_authenticated:
+                return _json({'detail': 'Нужна авторизация'}, status=401)
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return _json({'detail': 'Не найдено'}, status=404)
+            except InvalidFields as error:
+                return _json({'detail': str(error)}, status=400)
+        return wrapper
+    return decorator
+
+
+@api_view()
+@query_budget(queries=1 + THUMBNAIL_QUERIES, sql_ms=100)
+def index(request):
+    return _post_page(
+        request, paginator(Post.objects.for_feed(), request)
+    )
+
+
+@api_view()
+@query_budget(queries=2 + THUMBNAIL_QUERIES, sql_ms=100)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _post_page(request, paginator(group.posts.for_feed(), request))
+
+
+@api_view()
+@query_budget(queries=2 + THUMBNAIL_QUERIES, sql_ms=100)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    post_list = Post.objects.filter(author=author).for_feed()
+    return _post_page(request, paginator(post_list, request))
+
+
+@api_view(login_required=True)
+@query_budget(
+    queries=lambda: feeds.page_queries() + THUMBNAIL_QUERIES, sql_ms=100
+)
+def follow_index(request):
+    return _post_page(request, feeds.follow_page(request))
+
+
+@api_view()
+@query_budget(queries=1 + THUMBNAIL_QUERIES, sql_ms=50)
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    fields = _selected_fields(request, POST_FIELDS)
+    return _json(_serialize([post], fields, POST_FIELDS)[0])
+
+
+@api_view()
+@query_budget(queries=1, sql_ms=50)
+def post_comments(request, post_id):
+    fields = _selected_fields(request, COMMENT_FIELDS)
+    page_obj = comments_page(post_id, request.GET.get('cursor'))
+    return _page(page_obj, _serialize(page_obj, fields, COMMENT_FIELDS))
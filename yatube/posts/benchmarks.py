@@ -0,0 +1,238 @@
+"""Нагрузочный прогон публичных страниц на синтетических данных.
+
+build_dataset наполняет отдельную базу постами, комментариями и
+подписками, run_benchmark гоняет по ней страницы тестовым клиентом и
+считает перцентили задержки, число запросов и пиковую память процесса.
+Прогон идёт со своим кэшем во временном каталоге, а каждая страница —
+в транзакции, которая откатывается, так что ни кэш приложения, ни
+набор данных прогон не меняет и повторные прогоны сравнимы.
+
+Пик памяти (ru_maxrss) — рекорд всего процесса с его запуска, а не
+отдельной страницы: для страницы пишется и он (process_peak_rss_mb),
+и то, насколько страница его подняла (peak_rss_growth_mb).
+
+Результат — словарь, который команда benchmark_views пишет в JSON
+и сравнивает с сохранённым базовым прогоном через compare.
+"""
+import math
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .generating import Generator
+from .importing import finalize
+from .models import Follow, Group, Post
+
+User = get_user_model()
+
+BENCH_USERNAME = 'benchmark'
+POSTS_PER_AUTHOR = 50
+GROUPS = 20
+FOLLOWED_AUTHORS = 50
+FOLLOWS_PER_USER = 5
+COMMENTS_PER_POST = 1
+
+# Метрики, рост которых по сравнению с базовым прогоном — регрессия.
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries')
+
+
+def build_dataset(posts, seed=0):
+    """Заполняет пустую базу генератором: posts постов, авторы по
+    POSTS_PER_AUTHOR, комментарии и подписки пользователя benchmark."""
+    authors = max(posts // POSTS_PER_AUTHOR, FOLLOWED_AUTHORS)
+    Generator(
+        users=authors,
+        posts=posts,
+        comments=int(posts * COMMENTS_PER_POST),
+        follows=authors * FOLLOWS_PER_USER,
+        groups=GROUPS,
+        seed=seed,
+    ).run()
+    bench_user = User.objects.create_user(username=BENCH_USERNAME)
+    author_ids = list(
+        User.objects.exclude(pk=bench_user.pk).values_list('id', flat=True)
+    )
+    Follow.objects.bulk_create(
+        Follow(user=bench_user, author_id=author_id)
+        for author_id in random.Random(seed).sample(
+            author_ids, FOLLOWED_AUTHORS
+        )
+    )
+    finalize()
+
+
+class Scenario:
+    """Страница для замера: method, имя URL и выбор аргументов."""
+
+    def __init__(self, name, url_name, kwargs=None, method='get',
+                 data=None):
+        self.name = name
+        self.url_name = url_name
+        self.kwargs = kwargs or (lambda sample: {})
+        self.method = method
+        self.data = data
+
+    def request(self, client, sample):
+        url = reverse(self.url_name, kwargs=self.kwargs(sample))
+        if self.method == 'post':
+            return client.post(url, self.data)
+        return client.get(url)
+
+
+def _sample():
+    """Случайные, но воспроизводимые аргументы для страниц."""
+    posts = list(
+        Post.objects.order_by('-id').values_list('id', flat=True)[:1000]
+    )
+    return {
+        'posts': posts,
+        # Больше всего комментариев у самого популярного поста.
+        'hot_post': Post.objects.order_by('-comments_count')
+        .values_list('id', flat=True)[0],
+        'authors': list(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list('username', flat=True)[:100]
+        ),
+        'groups': list(Group.objects.values_list('slug', flat=True)),
+    }
+
+
+SCENARIOS = (
+    Scenario('index', 'posts:index'),
+    Scenario(
+        'group_posts', 'posts:group_posts',
+        lambda sample: {'slug': random.choice(sample['groups'])},
+    ),
+    Scenario(
+        'profile', 'posts:profile',
+        lambda sample: {'username': random.choice(sample['authors'])},
+    ),
+    Scenario(
+        'post_detail', 'posts:post_detail',
+        lambda sample: {'post_id': random.choice(sample['posts'])},
+    ),
+    Scenario(
+        'post_detail_hot', 'posts:post_detail',
+        lambda sample: {'post_id': sample['hot_post']},
+    ),
+    Scenario('follow_index', 'posts:follow_index'),
+    Scenario(
+        'add_comment', 'posts:add_comment',
+        lambda sample: {'post_id': random.choice(sample['posts'])},
+        method='post', data={'text': 'Комментарий из бенчмарка'},
+    ),
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _peak_rss_mb():
+    """Рекорд памяти процесса с его запуска, МБ."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def isolated_cache():
+    """Кэш прогона в своём временном файле: cache.clear() между
+    страницами не трогает кэш приложения."""
+    with tempfile.TemporaryDirectory(prefix='yatube-bench-cache-') as path:
+        default = settings.CACHES['default']
+        caches = {'default': {
+            **default,
+            'LOCATION': os.path.join(path, 'cache.sqlite3'),
+        }}
+        with override_settings(CACHES=caches):
+            yield
+
+
+def run_scenario(scenario, client, sample, requests):
+    rss_before = _peak_rss_mb()
+    # Всё, что страница пишет в базу, откатывается.
+    with transaction.atomic():
+        # Число запросов к базе снимается отдельным проходом: перехват
+        # запросов сам по себе замедляет их и исказил бы задержку.
+        # Журнал очищается в начале каждого запроса, поэтому счёт
+        # берётся сразу.
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            scenario.request(client, sample)
+        queries = len(captured)
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = scenario.request(client, sample)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{scenario.name}: ответ {response.status_code}'
+                )
+        transaction.set_rollback(True)
+    peak = _peak_rss_mb()
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': queries,
+        'process_peak_rss_mb': round(peak, 1),
+        'peak_rss_growth_mb': round(peak - rss_before, 1),
+    }
+
+
+def run_benchmark(requests, scenarios=SCENARIOS, seed=0):
+    random.seed(seed)
+    sample = _sample()
+    with isolated_cache():
+        client = Client()
+        client.force_login(User.objects.get(username=BENCH_USERNAME))
+        results = {
+            scenario.name: run_scenario(scenario, client, sample, requests)
+            for scenario in scenarios
+        }
+    return {
+        'posts': Post.objects.count(),
+        'requests': requests,
+        'scenarios': results,
+        'process_peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно baseline: [(страница, метрика, было, стало)].
+
+    Задержка считается регрессией при росте больше чем на tolerance
+    (доля), число запросов — при любом росте.
+    """
+    regressions = []
+    for name, metrics in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in before:
+                continue
+            limit = before[metric]
+            if metric != 'queries':
+                limit *= 1 + tolerance
+            if metrics[metric] > limit:
+                regressions.append(
+                    (name, metric, before[metric], metrics[metric])
+                )
+    return regressions
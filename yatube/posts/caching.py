@@ -0,0 +1,142 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+from . import thumbnails
+
+GENERATION_KEY = 'posts:feed_generation'
+CHANGED_AT_KEY = 'posts:changed_at'
+
+
+def _initial_generation():
+    # Если ключ вытеснен из кэша, новое поколение не должно совпасть
+    # ни с одним из старых, поэтому начинаем с текущего времени.
+    return int(time.time() * 1000)
+
+
+def get_generation():
+    return cache.get_or_set(GENERATION_KEY, _initial_generation, None)
+
+
+def bump_generation():
+    """Делает недействительными все закэшированные фрагменты лент."""
+    cache.set(CHANGED_AT_KEY, time.time(), None)
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = _initial_generation()
+        cache.set(GENERATION_KEY, generation, None)
+        return generation
+
+
+def bump_generation_on_commit():
+    """Сбрасывает поколение сейчас и ещё раз после фиксации транзакции.
+
+    Страница, отрисованная параллельно из ещё не зафиксированных строк,
+    попала бы в кэш под новым поколением и с его ETag; второй сброс её
+    вытесняет. В одной транзакции он ставится один раз.
+    """
+    bump_generation()
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and not any(
+        func is bump_generation for _, func in connection.run_on_commit
+    ):
+        transaction.on_commit(bump_generation)
+
+
+def _validators(request):
+    # Оба валидатора читаются одним обращением к кэшу на запрос.
+    if not hasattr(request, '_page_validators'):
+        values = cache.get_many([GENERATION_KEY, CHANGED_AT_KEY])
+        if len(values) < 2:
+            # Ключи вытеснены: новые значения не старше настоящих,
+            # так что клиент в худшем случае лишний раз получит 200.
+            values = {
+                GENERATION_KEY: get_generation(),
+                CHANGED_AT_KEY: cache.get_or_set(
+                    CHANGED_AT_KEY, time.time, None
+                ),
+            }
+        request._page_validators = values
+    return request._page_validators
+
+
+def _csrf_state(request):
+    # Токен меняется при входе, а формы страницы несут его в HTML:
+    # страница из кэша браузера со старым токеном дала бы 403 на POST.
+    token = request.META.get('CSRF_COOKIE', '')
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def page_etag(request, *args, **kwargs):
+    """Слабый ETag страницы: поколение данных, пользователь и CSRF-токен.
+
+    Страница зависит от пользователя (шапка, кнопка подписки), поэтому
+    его id входит в ETag, а формы — от CSRF-токена, который входит в
+    ETag отпечатком; адрес с курсором клиенты различают сами.
+    """
+    generation = _validators(request)[GENERATION_KEY]
+    return (
+        f'W/"{generation}-{request.user.pk or 0}-{_csrf_state(request)}"'
+    )
+
+
+def page_last_modified(request, *args, **kwargs):
+    changed_at = _validators(request)[CHANGED_AT_KEY]
+    return datetime.fromtimestamp(changed_at, timezone.utc)
+
+
+_condition = condition(
+    etag_func=page_etag, last_modified_func=page_last_modified
+)
+
+
+def conditional_page(view):
+    """Отвечает 304 до выполнения вида, если у клиента актуальная версия.
+
+    Страница с заглушкой вместо миниатюры изменится, когда миниатюра
+    будет готова, а поколение данных при этом не сбрасывается, поэтому
+    такой ответ уходит без валидаторов.
+    """
+    conditional_view = _condition(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with thumbnails.track_placeholders() as placeholders:
+            response = conditional_view(request, *args, **kwargs)
+        if placeholders:
+            del response['ETag']
+            del response['Last-Modified']
+        return response
+    return wrapper
+
+
+def feed_cache(request, view_name, page_obj, per_user=False,
+               thumbnail_size='card'):
+    """Контекст для {% cache feed_cache_timeout name feed_cache_key %}.
+
+    Ключ складывается из поколения данных, вида, постов на странице
+    и состояния пользователя: анонимный или нет, а для персональных
+    лент — его id. Пост, миниатюра которого ещё не готова, входит в
+    ключ с пометкой, так что фрагмент с заглушкой перестаёт читаться,
+    как только миниатюра появится.
+    """
+    user_state = (
+        request.user.pk if per_user else int(request.user.is_authenticated)
+    )
+    parts = [get_generation(), view_name, user_state]
+    thumbnails.prefetch_thumbnails(page_obj, thumbnail_size)
+    for post in page_obj:
+        prefetched = getattr(post, '_prefetched_thumbnails', {})
+        pending = post.image and prefetched.get(thumbnail_size) is None
+        parts.append(f'{post.pk}~' if pending else post.pk)
+    return {
+        'feed_cache_key': ':'.join(str(part) for part in parts),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+def change_user_counter(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя, не уходя ниже нуля."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def _count_by(queryset, field, outer):
+    """Подзапрос COUNT(*) по field для UPDATE ... SET."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field
+    ).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+@transaction.atomic
+def repair_counters():
+    """Пересчитывает все счётчики по данным одним UPDATE на таблицу."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'id', flat=True
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing]
+    )
+    users = UserStats.objects.update(
+        posts_count=_count_by(Post.objects, 'author', 'user'),
+        followers_count=_count_by(Follow.objects, 'author', 'user'),
+        following_count=_count_by(Follow.objects, 'user', 'user'),
+    )
+    posts = Post.objects.update(
+        comments_count=_count_by(Comment.objects, 'post', 'pk'),
+    )
+    return users, posts
@@ -0,0 +1,91 @@
+"""Потоковая выгрузка постов и комментариев автора.
+
+Записи в формате команды import_data: JSON Lines или CSV с общим
+заголовком. Строки читаются пачками по EXPORT_CHUNK_SIZE по ключу id,
+и каждая пачка дочитывается до конца отдельным запросом. Один курсор
+на всю выгрузку держал бы в SQLite разделяемую блокировку, пока клиент
+скачивает файл, и писатели ждали бы его всё это время.
+"""
+import csv
+import json
+
+from .models import Comment, Post
+
+EXPORT_CHUNK_SIZE = 500
+COLUMNS = (
+    'type', 'id', 'author', 'group', 'post', 'text', 'pub_date', 'created',
+    'image',
+)
+FORMATS = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _chunked(queryset, fields):
+    """Строки queryset.values(*fields) пачками по возрастанию id."""
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values(*fields)[:EXPORT_CHUNK_SIZE]
+        )
+        yield from chunk
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        last_id = chunk[-1]['id']
+
+
+def export_records(author):
+    for row in _chunked(
+        Post.objects.filter(author=author),
+        ('id', 'group__slug', 'text', 'pub_date', 'image'),
+    ):
+        yield {
+            'type': 'post',
+            'id': row['id'],
+            'author': author.username,
+            'group': row['group__slug'],
+            'text': row['text'],
+            'pub_date': row['pub_date'].isoformat(),
+            'image': row['image'] or None,
+        }
+    for row in _chunked(
+        Comment.objects.filter(author=author),
+        ('id', 'post_id', 'text', 'created'),
+    ):
+        yield {
+            'type': 'comment',
+            'id': row['id'],
+            'author': author.username,
+            'post': row['post_id'],
+            'text': row['text'],
+            'created': row['created'].isoformat(),
+        }
+
+
+def jsonl_lines(records):
+    for record in records:
+        record = {key: value for key, value in record.items()
+                  if value is not None}
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    # csv.writer пишет в объект с методом write; строка сразу отдаётся.
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(_Echo(), COLUMNS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def export_lines(author, export_format):
+    records = export_records(author)
+    if export_format == 'csv':
+        return csv_lines(records)
+    return jsonl_lines(records)
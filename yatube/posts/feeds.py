@@ -0,0 +1,296 @@
+import heapq
+import json
+from collections import namedtuple
+from itertools import dropwhile, islice, takewhile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+from .models import FeedEntry, Follow, Post
+from .utils import CursorPaginator, FeedPaginator, paginator
+
+MATERIALIZED = 'materialized'
+MERGE = 'merge'
+JOIN = 'join'
+
+TIMELINE_KEY = 'posts:timeline:{}'
+TIMELINE_TIMEOUT = 60 * 60 * 24
+
+TimelineKey = namedtuple('TimelineKey', 'pub_date id')
+
+# Последние посты каждого автора из списка одним запросом: для каждого
+# автора подзапрос с LIMIT идёт по индексу post_author_pub_date.
+TIMELINES = '''
+SELECT post.author_id, post.pub_date, post.id
+FROM json_each(%s) AS author
+JOIN {table} AS post ON post.id IN (
+    SELECT recent.id FROM {table} AS recent
+    WHERE recent.author_id = author.value
+    ORDER BY recent.pub_date DESC, recent.id DESC LIMIT %s
+)
+'''
+
+# Запросов к базе на страницу ленты у каждого движка в худшем случае:
+# слиянию нужны подписки, промахи кэша лент авторов и посты страницы.
+PAGE_QUERIES = {MATERIALIZED: 1, MERGE: 3, JOIN: 1}
+
+# Сколько подписчиков обрабатывается за одну транзакцию рассылки.
+FAN_OUT_BATCH = 500
+
+# Записи ленты пользователя за пределами FOLLOW_FEED_MAX_ENTRIES;
+# подзапрос идёт по индексу feed_entry_user_pub_date. Оконная функция
+# по всей пачке сразу оказалась в 25 раз медленнее.
+TRIM_FEED = '''
+DELETE FROM {table} WHERE id IN (
+    SELECT id FROM {table} WHERE user_id = %s
+    ORDER BY pub_date DESC, post_id DESC LIMIT -1 OFFSET %s
+)
+'''
+
+# Все ленты заново одним INSERT ... SELECT: подписки соединяются
+# с постами авторов, и у каждого пользователя остаются последние
+# FOLLOW_FEED_MAX_ENTRIES записей.
+REBUILD_FEEDS = '''
+INSERT INTO {feed} (user_id, post_id, pub_date)
+SELECT user_id, post_id, pub_date FROM (
+    SELECT follow.user_id, post.id AS post_id, post.pub_date,
+        ROW_NUMBER() OVER (
+            PARTITION BY follow.user_id
+            ORDER BY post.pub_date DESC, post.id DESC
+        ) AS position
+    FROM {follow} AS follow
+    JOIN {post} AS post ON post.author_id = follow.author_id
+)
+WHERE position <= %s
+'''
+
+
+def _max_entries():
+    return settings.FOLLOW_FEED_MAX_ENTRIES
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора.
+
+    Подписчики читаются пачками по FAN_OUT_BATCH, и ленты каждой пачки
+    сразу обрезаются до FOLLOW_FEED_MAX_ENTRIES. Вызывается после
+    ответа (core.deferred), поэтому пост мог уже исчезнуть с откатом
+    транзакции или удалением.
+    """
+    if not Post.objects.filter(pk=post.pk).exists():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).order_by('user_id').values_list('user_id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(followers.filter(user_id__gt=last_id)[:FAN_OUT_BATCH])
+        if not batch:
+            break
+        with transaction.atomic():
+            FeedEntry.objects.bulk_create(
+                [
+                    FeedEntry(
+                        user_id=user_id, post_id=post.pk,
+                        pub_date=post.pub_date,
+                    )
+                    for user_id in batch
+                ],
+                ignore_conflicts=True,
+            )
+            trim_feeds(batch)
+        last_id = batch[-1]
+
+
+@transaction.atomic
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки.
+
+    Вызывается после ответа (core.deferred), когда подписку могли уже
+    отменить.
+    """
+    follow = Follow.objects.filter(user_id=user_id, author_id=author_id)
+    if not follow.exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:_max_entries()]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim_feed(user_id)
+
+
+def drop_author(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim_feed(user_id):
+    """Оставляет в ленте не больше FOLLOW_FEED_MAX_ENTRIES записей."""
+    stale_ids = list(
+        FeedEntry.objects.filter(user_id=user_id)
+        .order_by('-pub_date', '-post_id')
+        .values_list('id', flat=True)[_max_entries():]
+    )
+    if stale_ids:
+        FeedEntry.objects.filter(id__in=stale_ids).delete()
+    return len(stale_ids)
+
+
+def trim_feeds(user_ids):
+    """trim_feed для многих пользователей одним executemany."""
+    table = connection.ops.quote_name(FeedEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            TRIM_FEED.format(table=table),
+            [(user_id, _max_entries()) for user_id in user_ids]
+        )
+
+
+@transaction.atomic
+def rebuild_feed(user_id):
+    """Собирает ленту пользователя заново из его подписок."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user_id=user_id
+    ).order_by('-pub_date', '-id').values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts[:_max_entries()]
+        ]
+    )
+
+
+@transaction.atomic
+def rebuild_all_feeds():
+    """rebuild_feed для всех пользователей одним запросом."""
+    quote = connection.ops.quote_name
+    FeedEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            REBUILD_FEEDS.format(
+                feed=quote(FeedEntry._meta.db_table),
+                follow=quote(Follow._meta.db_table),
+                post=quote(Post._meta.db_table),
+            ),
+            [_max_entries()],
+        )
+
+
+def engine():
+    return settings.FOLLOW_FEED_ENGINE
+
+
+def follow_page(request):
+    """Страница ленты подписок тем движком, что выбран в настройках."""
+    if engine() == MATERIALIZED:
+        entries = FeedEntry.objects.filter(user=request.user).for_feed()
+        return paginator(entries, request, FeedPaginator)
+    if engine() == MERGE:
+        author_ids = list(
+            Follow.objects.filter(user=request.user)
+            .values_list('author_id', flat=True)
+        )
+        return paginator(author_ids, request, TimelineMergePaginator)
+    if engine() == JOIN:
+        post_list = Post.objects.filter(
+            author__following__user=request.user
+        ).for_feed()
+        return paginator(post_list, request)
+    raise ImproperlyConfigured(
+        f'Неизвестный FOLLOW_FEED_ENGINE: {engine()!r}'
+    )
+
+
+def page_queries():
+    """Бюджет запросов страницы ленты для выбранного движка."""
+    return PAGE_QUERIES.get(engine(), 0)
+
+
+def load_timelines(author_ids):
+    """Ключи последних постов авторов, от новых к старым, по id автора."""
+    timelines = {author_id: [] for author_id in author_ids}
+    if not timelines:
+        return timelines
+    sql = TIMELINES.format(
+        table=connection.ops.quote_name(Post._meta.db_table)
+    )
+    posts = Post.objects.raw(
+        sql, [json.dumps(list(timelines)),
+              settings.FOLLOW_FEED_TIMELINE_LENGTH]
+    )
+    for post in posts:
+        timelines[post.author_id].append(TimelineKey(post.pub_date, post.id))
+    for timeline in timelines.values():
+        timeline.sort(reverse=True)
+    return timelines
+
+
+def get_timelines(author_ids):
+    """Ленты авторов из кэша одним get_many, промахи — одним запросом."""
+    keys = {TIMELINE_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    timelines = cache.get_many(keys)
+    missing = [
+        author_id for key, author_id in keys.items() if key not in timelines
+    ]
+    if missing:
+        loaded = {
+            TIMELINE_KEY.format(author_id): timeline
+            for author_id, timeline in load_timelines(missing).items()
+        }
+        cache.set_many(loaded, TIMELINE_TIMEOUT)
+        timelines.update(loaded)
+    return list(timelines.values())
+
+
+def invalidate_timeline(author_id):
+    cache.delete(TIMELINE_KEY.format(author_id))
+
+
+def invalidate_timelines(author_ids):
+    cache.delete_many([TIMELINE_KEY.format(pk) for pk in author_ids])
+
+
+class TimelineMergePaginator(CursorPaginator):
+    """Лента подписок слиянием кэшированных лент авторов.
+
+    object_list — id авторов, на которых подписан пользователь.
+    Ключи (pub_date, id) сливаются кучей (k-way merge), из базы
+    читаются только посты текущей страницы. Лента ограничена
+    FOLLOW_FEED_TIMELINE_LENGTH записями: глубже хранимой
+    истории авторов слияние не заглядывает.
+    """
+
+    def _merged(self):
+        return islice(
+            heapq.merge(*get_timelines(self.object_list), reverse=True),
+            settings.FOLLOW_FEED_TIMELINE_LENGTH,
+        )
+
+    def rows_from(self, offset, limit):
+        return list(islice(self._merged(), offset, offset + limit))
+
+    def rows_after(self, pub_date, pk, limit):
+        key = (pub_date, pk)
+        older = dropwhile(lambda row: row >= key, self._merged())
+        return list(islice(older, limit))
+
+    def rows_before(self, pub_date, pk, limit):
+        key = (pub_date, pk)
+        newer = list(takewhile(lambda row: row > key, self._merged()))
+        return newer[::-1][:limit]
+
+    def to_objects(self, rows):
+        posts = Post.objects.for_feed().in_bulk([row.id for row in rows])
+        return [posts[row.id] for row in rows if row.id in posts]
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import IMAGE_ERRORS, normalize_upload
 from .models import Post, Comment
 
 
@@ -8,6 +10,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return normalize_upload(image)
+        except IMAGE_ERRORS:
+            raise forms.ValidationError(
+                'Не удалось обработать картинку: файл повреждён '
+                'или слишком велик.',
+                code='invalid_image',
+            )
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
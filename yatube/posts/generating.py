@@ -0,0 +1,234 @@
+"""Быстрый генератор синтетической социальной сети.
+
+Строки пишутся сырыми INSERT через executemany пачками по batch_size,
+минуя модели, формы и сигналы, поэтому миллионы строк собираются за
+минуты. id назначаются заранее, следом за уже существующими, и
+ссылки между таблицами считаются без чтения из базы. Имена
+пользователей и адреса групп начинаются с префикса прогона (по
+умолчанию r<первый id>-), а если такие уже есть в базе, генератор
+отказывается писать, а не падает на уникальности посреди прогона.
+
+Распределения перекошены, как в живых сетях: активность авторов и
+популярность постов подчиняются степенному закону, а подписки
+стягиваются к небольшому числу «знаменитостей». Один и тот же seed
+на той же базе даёт одни и те же строки; даты отсчитываются назад от
+anchor, так что совпадают и они, только если anchor задан явно — по
+умолчанию это текущий момент.
+
+Как и после import_data, счётчики, поисковый индекс и ленты подписок
+нужно досчитать через importing.finalize().
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Чем больше показатель, тем сильнее перекос к началу списка.
+AUTHOR_SKEW = 3
+POST_SKEW = 4
+CELEBRITY_SKEW = 6
+GROUP_SKEW = 2
+GROUPLESS_SHARE = 0.4
+
+FIRST_NAMES = (
+    'Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна', 'Иван',
+    'Кира', 'Лев', 'Мария', 'Никита', 'Ольга', 'Павел', 'Софья', 'Тимур',
+)
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров',
+    'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков',
+)
+WORDS = (
+    'город', 'утро', 'кофе', 'работа', 'проект', 'код', 'книга', 'фильм',
+    'музыка', 'дорога', 'море', 'горы', 'снег', 'лето', 'друзья', 'семья',
+    'кошка', 'собака', 'рецепт', 'ужин', 'поезд', 'отпуск', 'релиз',
+    'python', 'django', 'база', 'запрос', 'индекс', 'кэш', 'лента',
+    'сегодня', 'вчера', 'завтра', 'снова', 'наконец', 'очень', 'просто',
+    'новый', 'старый', 'большой', 'быстрый', 'тихий', 'смешной', 'важный',
+    'думаю', 'читаю', 'пишу', 'слушаю', 'смотрю', 'еду', 'жду', 'люблю',
+)
+
+
+class GenerationConflict(ValueError):
+    pass
+
+
+def skewed_index(rng, size, skew):
+    """Индекс от 0 до size - 1 со степенным перекосом к началу.
+
+    Плотность u ** skew при равномерном u убывает как x ** (1/skew - 1),
+    так что первые индексы выпадают гораздо чаще последних.
+    """
+    return int(size * rng.random() ** skew)
+
+
+class Generator:
+    """Пишет users пользователей, groups групп, posts постов,
+    comments комментариев и около follows подписок."""
+
+    def __init__(self, users, posts, comments=0, follows=0, groups=20,
+                 days=365, seed=0, batch_size=10000, on_progress=None,
+                 anchor=None, prefix=None):
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.groups = groups
+        self.days = days
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.rng = random.Random(seed)
+        self.now = (anchor or timezone.now()).replace(microsecond=0)
+        self.start = self.now - timedelta(days=days)
+        self.prefix = prefix
+        self.written = {}
+
+    def run(self):
+        self.user_ids = self._ids(User, self.users)
+        self.group_ids = self._ids(Group, self.groups)
+        self.post_ids = self._ids(Post, self.posts)
+        if self.prefix is None:
+            self.prefix = f'r{self.user_ids.start}-'
+        self._check_prefix()
+        # Место в рейтинге активности и популярности не связано с id.
+        self.authors = self._shuffled(self.user_ids)
+        self.celebrities = self._shuffled(self.user_ids)
+        self.popular_posts = self._shuffled(self.post_ids)
+        self._write(User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name',
+            'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+        ), self._user_rows())
+        self._write(Group, ('id', 'title', 'slug', 'description'), (
+            (
+                pk, f'Группа {pk}', f'{self.prefix}group-{pk}',
+                f'Описание группы {pk}',
+            )
+            for pk in self.group_ids
+        ))
+        self._write(Post, (
+            'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+            'comments_count',
+        ), self._post_rows())
+        self._write(
+            Comment, ('post_id', 'author_id', 'text', 'created'),
+            self._comment_rows(),
+        )
+        self._write(Follow, ('user_id', 'author_id'), self._follow_rows())
+        return self.written
+
+    def _check_prefix(self):
+        taken = (
+            User.objects.filter(username__startswith=self.prefix).exists()
+            or Group.objects.filter(slug__startswith=self.prefix).exists()
+        )
+        if taken:
+            raise GenerationConflict(
+                f'В базе уже есть пользователи или группы с префиксом '
+                f'{self.prefix!r}'
+            )
+
+    def _ids(self, model, count):
+        last = model.objects.aggregate(last=Max('id'))['last'] or 0
+        return range(last + 1, last + 1 + count)
+
+    def _shuffled(self, ids):
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        return ids
+
+    def _pick(self, ids, skew):
+        return ids[skewed_index(self.rng, len(ids), skew)]
+
+    def _text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def _date(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def _post_date(self, pk):
+        # Посты идут равномерно по времени в порядке id, как в жизни.
+        offset = (pk - self.post_ids.start) / max(len(self.post_ids), 1)
+        return self.start + timedelta(days=self.days * offset)
+
+    def _user_rows(self):
+        # Пароль, начинающийся с «!», Django считает непригодным.
+        joined = self._date(self.start)
+        for pk in self.user_ids:
+            username = f'{self.prefix}user{pk}'
+            yield (
+                pk, '!', False, username, self.rng.choice(FIRST_NAMES),
+                self.rng.choice(LAST_NAMES), f'{username}@example.com',
+                False, True, joined,
+            )
+
+    def _post_rows(self):
+        for pk in self.post_ids:
+            group_id = None
+            if self.group_ids and self.rng.random() >= GROUPLESS_SHARE:
+                group_id = self._pick(self.group_ids, GROUP_SKEW)
+            yield (
+                pk, self._text(5, 40), self._date(self._post_date(pk)),
+                self._pick(self.authors, AUTHOR_SKEW), group_id, '', 0,
+            )
+
+    def _comment_rows(self):
+        for _ in range(self.comments if self.post_ids else 0):
+            post_id = self._pick(self.popular_posts, POST_SKEW)
+            published = self._post_date(post_id)
+            delay = (self.now - published) * self.rng.random() ** 3
+            yield (
+                post_id, self._pick(self.authors, AUTHOR_SKEW),
+                self._text(2, 15), self._date(published + delay),
+            )
+
+    def _follow_rows(self):
+        if len(self.user_ids) < 2:
+            return
+        average = self.follows / len(self.user_ids)
+        for user_id in self.user_ids:
+            # Число подписок тоже с длинным хвостом вокруг среднего.
+            wanted = min(
+                round(self.rng.expovariate(1 / average)) if average else 0,
+                len(self.user_ids) - 1,
+            )
+            authors = set()
+            for _ in range(wanted * 4):
+                if len(authors) == wanted:
+                    break
+                author_id = self._pick(self.celebrities, CELEBRITY_SKEW)
+                if author_id != user_id:
+                    authors.add(author_id)
+            for author_id in sorted(authors):
+                yield user_id, author_id
+
+    def _write(self, model, columns, rows):
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        name = model._meta.model_name
+        self.written[name] = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                self._flush(name, sql, batch)
+                batch = []
+        if batch:
+            self._flush(name, sql, batch)
+
+    def _flush(self, name, sql, batch):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        self.written[name] += len(batch)
+        if self.on_progress:
+            self.on_progress(name, self.written[name])
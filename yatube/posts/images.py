@@ -0,0 +1,101 @@
+"""Нормализация загружаемых картинок постов.
+
+Картинка уменьшается до POST_IMAGE_MAX_SIZE, поворачивается по
+EXIF-ориентации и сохраняется без метаданных (EXIF, XMP, комментарии;
+ICC-профиль остаётся). Декодирование и кодирование в Pillow выполняются
+в ограниченном пуле процессов, чтобы не занимать GIL потоков,
+обслуживающих другие запросы. Сам запрос с загрузкой при этом ждёт
+результата: форма сохраняет уже нормализованный файл, поэтому время
+обработки входит во время ответа на post_create и post_edit.
+
+Битая или слишком большая картинка поднимает одно из IMAGE_ERRORS.
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+ORIENTATION_TAG = 0x0112
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+# Что Pillow поднимает на повреждённых файлах: обрезанные данные
+# (OSError), негодная структура (SyntaxError) и «бомбы» распаковки.
+IMAGE_ERRORS = (OSError, SyntaxError, Image.DecompressionBombError)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn, а не fork: в процессе уже работают потоки.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.POST_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def normalize_image(data, max_size, quality):
+    """Возвращает новые байты картинки или None, если менять нечего.
+
+    Выполняется в дочернем процессе, поэтому не обращается к Django.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format
+        if getattr(image, 'is_animated', False):
+            return None
+        exif = image.getexif()
+        rotated = exif.get(ORIENTATION_TAG, 1) != 1
+        has_metadata = bool(exif) or any(
+            key in image.info for key in METADATA_KEYS
+        )
+        too_big = image.width > max_size[0] or image.height > max_size[1]
+        if not (too_big or rotated or has_metadata):
+            return None
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        if too_big:
+            image.thumbnail(max_size, Image.LANCZOS)
+        image.info = {}
+        params = {}
+        if icc_profile:
+            params['icc_profile'] = icc_profile
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            params.update(quality=quality, optimize=True, progressive=True)
+        elif image_format == 'PNG':
+            params['optimize'] = True
+        elif image_format == 'WEBP':
+            params['quality'] = quality
+        output = io.BytesIO()
+        image.save(output, image_format, **params)
+        return output.getvalue()
+
+
+def normalize_upload(upload):
+    """Нормализованная копия загруженного файла или он сам без изменений.
+
+    Блокирует вызывающий поток до конца обработки, в том числе при
+    POST_IMAGE_WORKERS > 0.
+    """
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    args = (
+        data, tuple(settings.POST_IMAGE_MAX_SIZE), settings.POST_IMAGE_QUALITY
+    )
+    if settings.POST_IMAGE_WORKERS:
+        normalized = _get_executor().submit(normalize_image, *args).result()
+    else:
+        normalized = normalize_image(*args)
+    if normalized is None:
+        return upload
+    return SimpleUploadedFile(upload.name, normalized, upload.content_type)
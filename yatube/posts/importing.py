@@ -0,0 +1,448 @@
+"""Потоковый импорт данных со старой платформы.
+
+На входе JSONL, где у каждой записи есть поле type, или CSV с записями
+одного типа. Строки читаются по одной и копятся в буферах не больше
+batch_size, затем записываются пачкой INSERT в одной транзакции,
+поэтому расход памяти не зависит от размера файла. После каждой
+транзакции номер последней обработанной строки сохраняется в файл
+контрольной точки, и повторный запуск продолжает с него.
+
+Записи ссылаются друг на друга по естественным ключам: пользователи
+по username, группы по slug, посты и комментарии по id из исходной
+системы. Посты и комментарии получают здесь свои id, а связь с
+исходными хранит ImportedRecord; запись без id узнаётся по отпечатку
+содержимого. Уже записанные пользователи, группы, подписки, посты и
+комментарии пропускаются, так что пачка, записанная перед сбоем, но не
+попавшая в контрольную точку, при повторе не размножится.
+
+Пачки пишутся в обход save(), как это делает loaddata: даты из
+исходной системы не заменяются значениями auto_now_add, а сигналы не
+вызываются, поэтому счётчики, поисковый индекс
+и ленты подписок пересчитываются в finalize() после импорта.
+"""
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feeds, search
+from .caching import bump_generation
+from .counters import repair_counters
+from .models import Comment, Follow, Group, ImportedRecord, Post
+
+User = get_user_model()
+
+# Порядок записи пачки: сначала то, на что ссылаются остальные.
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+MODELS = {
+    'user': User,
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+# Типы, которые получают здесь свои id; поля отпечатка записи без id.
+KEYED_FIELDS = {
+    'post': ('author', 'group', 'pub_date', 'text'),
+    'comment': ('post', 'author', 'created', 'text'),
+}
+# Связи уже проверены поиском по пачке, password — готовый хэш.
+RESOLVED_FIELDS = ('user', 'author', 'group', 'post', 'password')
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def jsonl_records(stream):
+    """Записи JSONL по одной; битая строка отдаётся как InvalidRow.
+
+    Вместо пустой строки отдаётся None, чтобы номера записей совпадали
+    с номерами строк файла.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield InvalidRow(f'не JSON: {error}')
+            continue
+        if not isinstance(record, dict):
+            yield InvalidRow('ожидался объект JSON')
+            continue
+        yield record
+
+
+def csv_records(stream, record_type):
+    """Строки CSV как записи типа record_type; пустые ячейки опускаются."""
+    for row in csv.DictReader(stream):
+        record = {key: value for key, value in row.items() if value != ''}
+        record['type'] = record_type
+        yield record
+
+
+def _required(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        raise InvalidRow(f'нет поля {field}')
+    return value
+
+
+def _optional_id(record):
+    if record.get('id') in (None, ''):
+        return None
+    try:
+        return int(record['id'])
+    except (TypeError, ValueError):
+        raise InvalidRow(f'id не число: {record["id"]!r}')
+
+
+def _source_key(record, fields):
+    """Ключ записи в исходной системе: id или отпечаток полей fields."""
+    source_id = _optional_id(record)
+    if source_id is not None:
+        return f'id:{source_id}'
+    content = json.dumps(
+        [str(record.get(field, '')) for field in fields], ensure_ascii=False
+    )
+    return f'sha:{hashlib.sha1(content.encode()).hexdigest()}'
+
+
+def _datetime(record, field):
+    raw = record.get(field)
+    if raw in (None, ''):
+        return timezone.now()
+    try:
+        value = parse_datetime(raw)
+    except (TypeError, ValueError):
+        value = None
+    if value is None:
+        raise InvalidRow(f'{field} не дата: {raw!r}')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
+def _insert(model, objects):
+    """Пишет объекты с теми значениями полей, что в них заданы.
+
+    В отличие от bulk_create, поля auto_now_add не перезаписываются
+    текущим временем. Строки с конфликтом уникальных ключей пропускаются;
+    возвращается число вставленных строк.
+    """
+    inserted = 0
+    fields = model._meta.concrete_fields
+    with_pk = [obj for obj in objects if obj.pk is not None]
+    without_pk = [obj for obj in objects if obj.pk is None]
+    for objs, fields in (
+        (with_pk, fields),
+        (without_pk, [f for f in fields if not isinstance(f, AutoField)]),
+    ):
+        if not objs:
+            continue
+        size = connection.ops.bulk_batch_size(fields, objs) or len(objs)
+        for start in range(0, len(objs), size):
+            model._base_manager._insert(
+                objs[start:start + size], fields=fields, raw=True,
+                ignore_conflicts=True,
+            )
+            inserted += _changes()
+    return inserted
+
+
+def _insert_new(model, objects):
+    """Пишет объекты без id и проставляет им id из базы.
+
+    Один INSERT в SQLite получает подряд идущие rowid, так что id
+    пачки восстанавливаются по last_insert_rowid() и changes().
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not isinstance(field, AutoField)
+    ]
+    size = connection.ops.bulk_batch_size(fields, objects) or len(objects)
+    for start in range(0, len(objects), size):
+        batch = objects[start:start + size]
+        model._base_manager._insert(batch, fields=fields, raw=True)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT last_insert_rowid(), changes()')
+            last_id, inserted = cursor.fetchone()
+        assert inserted == len(batch)
+        for pk, obj in enumerate(batch, last_id - inserted + 1):
+            obj.pk = pk
+
+
+def _imported_ids(record_type, keys):
+    """{ключ: id} уже записанных постов или комментариев, которые
+    ещё существуют."""
+    mapped = dict(
+        ImportedRecord.objects.filter(
+            record_type=record_type, source_key__in=set(keys)
+        ).values_list('source_key', 'local_id')
+    )
+    alive = set(
+        MODELS[record_type].objects.filter(id__in=mapped.values())
+        .values_list('id', flat=True)
+    )
+    return {key: pk for key, pk in mapped.items() if pk in alive}
+
+
+def _changes():
+    # Строки, вставленные последним INSERT, без пропущенных конфликтов.
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT changes()')
+        return cursor.fetchone()[0]
+
+
+class Importer:
+    """Пишет поток записей в базу пачками с контрольными точками.
+
+    on_error(number, message) вызывается для каждой отброшенной строки,
+    on_flush(importer) — после каждой записанной пачки.
+    """
+
+    def __init__(self, batch_size=1000, checkpoint=None,
+                 on_error=None, on_flush=None):
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.on_error = on_error or (lambda number, message: None)
+        self.on_flush = on_flush or (lambda importer: None)
+        self.buffers = {record_type: [] for record_type in TYPES}
+        self.position = 0
+        self.processed = 0
+        self.written = Counter()
+        self.errors = 0
+        self.authors = set()
+
+    def load_checkpoint(self):
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        return 0
+
+    def save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            checkpoint.write(str(self.position))
+        os.replace(temporary, self.checkpoint)
+
+    def run(self, records):
+        """Импортирует записи, пропуская уже сохранённые в checkpoint."""
+        start = self.load_checkpoint()
+        self.position = start
+        for number, record in enumerate(records, 1):
+            if number <= start:
+                continue
+            self.position = number
+            if record is None:
+                continue
+            self.processed += 1
+            if isinstance(record, InvalidRow):
+                self.reject(number, record)
+                continue
+            record_type = record.get('type')
+            if record_type not in MODELS:
+                self.reject(number, f'неизвестный тип {record_type!r}')
+                continue
+            self.buffers[record_type].append((number, record))
+            if sum(map(len, self.buffers.values())) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.written
+
+    def reject(self, number, message):
+        self.errors += 1
+        self.on_error(number, str(message))
+
+    def flush(self):
+        self.authors = set()
+        with transaction.atomic():
+            for record_type in TYPES:
+                rows = self.buffers[record_type]
+                if not rows:
+                    continue
+                build = getattr(self, f'build_{record_type}s')
+                objects = []
+                for number, obj in build(rows):
+                    try:
+                        if isinstance(obj, InvalidRow):
+                            raise obj
+                        obj.clean_fields(exclude=RESOLVED_FIELDS)
+                    except (InvalidRow, ValidationError) as error:
+                        self.reject(number, error)
+                        continue
+                    objects.append(obj)
+                rows.clear()
+                if not objects:
+                    continue
+                if record_type in KEYED_FIELDS:
+                    inserted = self._insert_keyed(record_type, objects)
+                else:
+                    inserted = _insert(MODELS[record_type], objects)
+                self.written[record_type] += inserted
+        # Кэш лент авторов сбрасывается после фиксации, иначе его успели бы
+        # заполнить заново старыми данными.
+        feeds.invalidate_timelines(self.authors)
+        self.save_checkpoint()
+        self.on_flush(self)
+
+    def _insert_keyed(self, record_type, objects):
+        """Пишет ещё не импортированные объекты и запоминает их id."""
+        keys = [obj._source_key for obj in objects]
+        known = _imported_ids(record_type, keys)
+        fresh = {}
+        for obj in objects:
+            if obj._source_key not in known:
+                fresh.setdefault(obj._source_key, obj)
+        if not fresh:
+            return 0
+        _insert_new(MODELS[record_type], list(fresh.values()))
+        # Ключи удалённых с тех пор строк указывают на новые.
+        ImportedRecord.objects.filter(
+            record_type=record_type, source_key__in=fresh
+        ).delete()
+        ImportedRecord.objects.bulk_create(
+            ImportedRecord(
+                record_type=record_type, source_key=key, local_id=obj.pk
+            )
+            for key, obj in fresh.items()
+        )
+        return len(fresh)
+
+    def _build(self, rows, make):
+        # make(record) возвращает объект или бросает InvalidRow,
+        # который отдаётся вместо объекта.
+        for number, record in rows:
+            try:
+                yield number, make(record)
+            except InvalidRow as error:
+                yield number, error
+
+    def _ids(self, model, field, values):
+        values = [value for value in set(values) if value]
+        return dict(
+            model.objects.filter(**{f'{field}__in': values})
+            .values_list(field, 'id')
+        )
+
+    def build_users(self, rows):
+        def make(record):
+            fields = {name: record.get(name, '') for name in USER_FIELDS}
+            fields['username'] = _required(record, 'username')
+            return User(
+                password=record.get('password') or make_password(None),
+                date_joined=_datetime(record, 'date_joined'),
+                **fields,
+            )
+        return self._build(rows, make)
+
+    def build_groups(self, rows):
+        def make(record):
+            return Group(
+                slug=_required(record, 'slug'),
+                title=_required(record, 'title'),
+                description=record.get('description', ''),
+            )
+        return self._build(rows, make)
+
+    def build_posts(self, rows):
+        users = self._ids(
+            User, 'username', (record.get('author') for _, record in rows)
+        )
+        groups = self._ids(
+            Group, 'slug', (record.get('group') for _, record in rows)
+        )
+        self.authors.update(users.values())
+
+        def make(record):
+            author = _required(record, 'author')
+            if author not in users:
+                raise InvalidRow(f'нет пользователя {author!r}')
+            group = record.get('group')
+            if group and group not in groups:
+                raise InvalidRow(f'нет группы {group!r}')
+            post = Post(
+                author_id=users[author],
+                group_id=groups.get(group),
+                text=_required(record, 'text'),
+                pub_date=_datetime(record, 'pub_date'),
+                image=record.get('image', ''),
+            )
+            post._source_key = _source_key(record, KEYED_FIELDS['post'])
+            return post
+        return self._build(rows, make)
+
+    def build_comments(self, rows):
+        users = self._ids(
+            User, 'username', (record.get('author') for _, record in rows)
+        )
+        post_keys = set()
+        for _, record in rows:
+            try:
+                post_keys.add(f'id:{int(record.get("post"))}')
+            except (TypeError, ValueError):
+                pass
+        posts = _imported_ids('post', post_keys)
+
+        def make(record):
+            author = _required(record, 'author')
+            if author not in users:
+                raise InvalidRow(f'нет пользователя {author!r}')
+            try:
+                post_id = int(_required(record, 'post'))
+            except ValueError:
+                raise InvalidRow(f'post не число: {record["post"]!r}')
+            if f'id:{post_id}' not in posts:
+                raise InvalidRow(f'нет поста {post_id}')
+            comment = Comment(
+                post_id=posts[f'id:{post_id}'],
+                author_id=users[author],
+                text=_required(record, 'text'),
+                created=_datetime(record, 'created'),
+            )
+            comment._source_key = _source_key(
+                record, KEYED_FIELDS['comment']
+            )
+            return comment
+        return self._build(rows, make)
+
+    def build_follows(self, rows):
+        users = self._ids(User, 'username', (
+            username for _, record in rows
+            for username in (record.get('user'), record.get('author'))
+        ))
+
+        def make(record):
+            user = _required(record, 'user')
+            author = _required(record, 'author')
+            for username in (user, author):
+                if username not in users:
+                    raise InvalidRow(f'нет пользователя {username!r}')
+            if user == author:
+                raise InvalidRow('подписка на самого себя')
+            return Follow(user_id=users[user], author_id=users[author])
+        return self._build(rows, make)
+
+
+def finalize():
+    """Досчитывает то, что при обычной записи делают сигналы."""
+    repair_counters()
+    search.rebuild_index()
+    if feeds.engine() == feeds.MATERIALIZED:
+        feeds.rebuild_all_feeds()
+    bump_generation()
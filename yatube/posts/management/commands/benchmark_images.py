@@ -0,0 +1,65 @@
+import io
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.images import ORIENTATION_TAG, normalize_image
+
+
+def make_photo(width, height):
+    """Шумная картинка размером с фото телефона, с EXIF-поворотом."""
+    noise = Image.effect_noise((width, height), 48)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (noise, gradient, noise))
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = 6
+    exif[0x010F] = 'Benchmark Camera'
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+
+def decode_time(data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём и время декодирования картинки '
+        'до и после нормализации при загрузке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=4032)
+        parser.add_argument('--height', type=int, default=3024)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        original = make_photo(options['width'], options['height'])
+        start = time.perf_counter()
+        normalized = normalize_image(
+            original,
+            tuple(settings.POST_IMAGE_MAX_SIZE),
+            settings.POST_IMAGE_QUALITY,
+        )
+        normalize_seconds = time.perf_counter() - start
+        rows = (
+            ('до', original),
+            ('после', normalized),
+        )
+        self.stdout.write(f'{"":8}{"байт":>12}{"декодирование, мс":>20}')
+        for label, data in rows:
+            millis = decode_time(data, options['repeat']) * 1000
+            self.stdout.write(f'{label:8}{len(data):>12}{millis:>20.1f}')
+        self.stdout.write(
+            f'Нормализация заняла {normalize_seconds * 1000:.1f} мс'
+        )
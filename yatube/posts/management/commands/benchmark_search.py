@@ -0,0 +1,126 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import (FTS_TABLE, MARK_END, MARK_START, SEARCH_SQL,
+                          SNIPPET_TOKENS, match_expression)
+
+SYLLABLES = (
+    'ба', 'ве', 'го', 'ду', 'жи', 'зо', 'ка', 'ле', 'ми', 'но',
+    'пу', 'ро', 'са', 'ти', 'фу', 'ха', 'це', 'чи', 'ша', 'ю',
+)
+WORDS_PER_POST = 30
+BATCH = 10000
+
+LIKE_COUNT_SQL = "SELECT COUNT(*) FROM post WHERE text LIKE ?"
+LIKE_PAGE_SQL = (
+    "SELECT id, text FROM post WHERE text LIKE ? "
+    "ORDER BY id DESC LIMIT 10"
+)
+FTS_COUNT_SQL = (
+    f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?'
+)
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def timed(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по постам через LIKE и через FTS5 '
+        'на синтетической базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def fill(self, conn, rng, posts):
+        vocabulary = make_vocabulary(rng, 20000)
+        # Частоты слов убывают как у естественного языка (закон Ципфа).
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+        for start in range(0, posts, BATCH):
+            rows = [
+                (' '.join(rng.choices(
+                    vocabulary, cum_weights=weights, k=WORDS_PER_POST
+                )),)
+                for _ in range(min(BATCH, posts - start))
+            ]
+            conn.executemany('INSERT INTO post (text) VALUES (?)', rows)
+        conn.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) SELECT id, text FROM post'
+        )
+        conn.commit()
+        return vocabulary
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with tempfile.TemporaryDirectory() as directory:
+            conn = sqlite3.connect(os.path.join(directory, 'search.sqlite3'))
+            conn.execute(
+                'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT)'
+            )
+            conn.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                "text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            start = time.perf_counter()
+            vocabulary = self.fill(conn, rng, options['posts'])
+            self.stdout.write(
+                f'Постов: {options["posts"]}, база собрана за '
+                f'{time.perf_counter() - start:.1f} с'
+            )
+            search_sql = SEARCH_SQL.format(
+                seek='', rank_order='ASC', id_order='DESC'
+            ).replace('%s', '?')
+            self.stdout.write(
+                f'{"запрос":24}{"LIKE count":>12}{"LIKE page":>12}'
+                f'{"FTS count":>12}{"FTS page":>12}   мс'
+            )
+            queries = (
+                ('стоп-слово', vocabulary[0]),
+                ('частое слово', vocabulary[200]),
+                ('редкое слово', vocabulary[-1]),
+                ('два слова', f'{vocabulary[1]} {vocabulary[50]}'),
+            )
+            for label, query in queries:
+                like = (f'%{query}%',)
+                expression = match_expression(query)
+                search_params = (
+                    MARK_START, MARK_END, '…', SNIPPET_TOKENS,
+                    expression, 10, 0,
+                )
+                row = (
+                    timed(conn, LIKE_COUNT_SQL, like, options['repeat']),
+                    timed(conn, LIKE_PAGE_SQL, like, options['repeat']),
+                    timed(conn, FTS_COUNT_SQL, (expression,),
+                          options['repeat']),
+                    timed(conn, search_sql, search_params,
+                          options['repeat']),
+                )
+                self.stdout.write(
+                    f'{label:24}' + ''.join(f'{value:>12.1f}' for value in row)
+                )
+            conn.close()
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.benchmarks import SCENARIOS, build_dataset, compare, run_benchmark
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов и память публичных страниц '
+        'на синтетической базе и сравнивает с базовым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=10000,
+            help='Размер набора данных: 10000, 100000, 1000000 постов'
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--database',
+            help='Файл базы для набора данных; по умолчанию во временном '
+                 'каталоге, чтобы собранный набор переиспользовался'
+        )
+        parser.add_argument('--output', help='Куда записать результат JSON')
+        parser.add_argument('--baseline', help='JSON базового прогона')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост задержки относительно базового прогона'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=[scenario.name for scenario in SCENARIOS],
+            help='Замерять только эти страницы'
+        )
+
+    def handle(self, *args, **options):
+        path = options['database'] or os.path.join(
+            tempfile.gettempdir(), f'yatube-bench-{options["posts"]}.sqlite3'
+        )
+        settings.DATABASES['default']['TEST'] = {'NAME': path}
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=True, serialize=False
+        )
+        # Замеры без DEBUG и Server-Timing: журнал запросов, debug_toolbar
+        # и выборочные замеры искажают время и засоряют вывод.
+        # Превышения бюджетов запросов на большом наборе — предупреждения,
+        # как в продакшене, а не исключения.
+        debug, settings.DEBUG = settings.DEBUG, False
+        strict, settings.QUERY_BUDGET_STRICT = (
+            settings.QUERY_BUDGET_STRICT, False
+        )
+        sample_rate, settings.SERVER_TIMING_SAMPLE_RATE = (
+            settings.SERVER_TIMING_SAMPLE_RATE, 0
+        )
+        try:
+            results = self.run(options)
+        finally:
+            settings.DEBUG = debug
+            settings.QUERY_BUDGET_STRICT = strict
+            settings.SERVER_TIMING_SAMPLE_RATE = sample_rate
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=True
+            )
+        self.report(results, options)
+
+    def run(self, options):
+        if Post.objects.count() != options['posts']:
+            if Post.objects.exists():
+                raise CommandError(
+                    'В базе уже другой набор данных, укажите --database'
+                )
+            start = time.perf_counter()
+            build_dataset(options['posts'])
+            self.stdout.write(
+                f'Набор на {options["posts"]} постов собран за '
+                f'{time.perf_counter() - start:.1f} с'
+            )
+        scenarios = SCENARIOS
+        if options['scenarios']:
+            scenarios = [
+                scenario for scenario in SCENARIOS
+                if scenario.name in options['scenarios']
+            ]
+        return run_benchmark(options['requests'], scenarios)
+
+    def report(self, results, options):
+        self.stdout.write(
+            f'{"страница":18}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросов":>10}{"+пик, МБ":>10}'
+        )
+        for name, metrics in results['scenarios'].items():
+            self.stdout.write(
+                f'{name:18}{metrics["p50_ms"]:>9.2f}{metrics["p95_ms"]:>9.2f}'
+                f'{metrics["p99_ms"]:>9.2f}{metrics["queries"]:>10}'
+                f'{metrics["peak_rss_growth_mb"]:>10.1f}'
+            )
+        # ru_maxrss — рекорд всего процесса, по страницам он не делится.
+        self.stdout.write(
+            f'Пик памяти процесса за прогон: '
+            f'{results["process_peak_rss_mb"]:.1f} МБ; «+пик» — '
+            f'насколько страница его подняла'
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+        if not options['baseline']:
+            return
+        with open(options['baseline']) as baseline:
+            regressions = compare(
+                results, json.load(baseline), options['tolerance']
+            )
+        for name, metric, before, after in regressions:
+            self.stderr.write(f'{name}: {metric} {before} → {after}')
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
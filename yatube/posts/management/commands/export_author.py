@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporting import FORMATS, export_lines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты и комментарии автора в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=tuple(FORMATS), default='jsonl'
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки (по умолчанию stdout)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        lines = export_lines(author, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,107 @@
+import resource
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.generating import GenerationConflict, Generator
+from posts.importing import finalize
+
+PROGRESS_SECONDS = 5
+
+
+def anchor_date(value):
+    anchor = parse_datetime(value)
+    if anchor is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        anchor = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(anchor):
+        anchor = timezone.make_aware(anchor)
+    return anchor
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует пользователей, группы, посты, комментарии и подписки '
+        'с перекосом активности, как в живой сети'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows', type=int, default=100000,
+            help='Примерное общее число подписок'
+        )
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределены посты'
+        )
+        parser.add_argument(
+            '--anchor', type=anchor_date,
+            help='Дата, от которой назад отсчитываются посты, например '
+                 '2024-01-01; с тем же --seed даёт те же даты. '
+                 'По умолчанию — текущий момент'
+        )
+        parser.add_argument(
+            '--prefix',
+            help='Префикс имён пользователей и адресов групп; по умолчанию '
+                 'r<первый id>-'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--skip-finalize', action='store_true',
+            help='Не пересчитывать счётчики, поиск и ленты после генерации'
+        )
+
+    def handle(self, *args, **options):
+        generator = Generator(
+            users=options['users'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            groups=options['groups'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            on_progress=self.report_progress,
+            anchor=options['anchor'],
+            prefix=options['prefix'],
+        )
+        self.started = self.reported = time.monotonic()
+        try:
+            written = generator.run()
+        except GenerationConflict as error:
+            raise CommandError(error)
+        elapsed = time.monotonic() - self.started
+        total = sum(written.values())
+        summary = ', '.join(
+            f'{name}: {rows}' for name, rows in written.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {total} за {elapsed:.1f} с '
+            f'({total / elapsed:.0f} строк/с); {summary}'
+        ))
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(f'Пиковая память процесса: {peak // 1024} МБ')
+        if not options['skip_finalize']:
+            start = time.monotonic()
+            finalize()
+            self.stdout.write(
+                'Счётчики, поиск и ленты пересчитаны за '
+                f'{time.monotonic() - start:.1f} с'
+            )
+
+    def report_progress(self, name, rows):
+        now = time.monotonic()
+        if now - self.reported < PROGRESS_SECONDS:
+            return
+        self.reported = now
+        self.stdout.write(f'{name}: {rows}')
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать (по умолчанию все)'
+        )
+        parser.add_argument(
+            '--trim-only', action='store_true',
+            help='Только обрезать ленты до FOLLOW_FEED_MAX_ENTRIES записей'
+        )
+
+    def handle(self, *args, **options):
+        if not options['usernames'] and not options['trim_only']:
+            feeds.rebuild_all_feeds()
+            self.stdout.write(self.style.SUCCESS('Все ленты пересобраны'))
+            return
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = users.values_list('id', flat=True)
+        processed = 0
+        for user_id in user_ids.iterator():
+            if options['trim_only']:
+                feeds.trim_feed(user_id)
+            else:
+                feeds.rebuild_feed(user_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано лент: {processed}'
+        ))
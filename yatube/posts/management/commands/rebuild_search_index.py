@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        posts = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {posts}'
+        ))
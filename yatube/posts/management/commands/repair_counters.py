@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        users, posts = repair_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        ))
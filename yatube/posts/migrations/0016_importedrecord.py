@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(max_length=16, verbose_name='Тип записи')),
+                ('source_key', models.CharField(max_length=64, verbose_name='Ключ в исходной системе')),
+                ('local_id', models.PositiveIntegerField(verbose_name='id записи')),
+            ],
+            options={
+                'verbose_name': 'Импортированная запись',
+                'verbose_name_plural': 'Импортированные записи',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importedrecord',
+            constraint=models.UniqueConstraint(fields=('record_type', 'source_key'), name='imported_record_unique'),
+        ),
+    ]
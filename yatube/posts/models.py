@@ -13,6 +13,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__slug', 'group__title', 'comments_count',
+    )
+
+    def for_feed(self):
+        """Посты с автором и группой одним JOIN-запросом.
+
+        Загружаются только колонки, которые нужны карточке поста.
+        """
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -42,9 +57,27 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_pub_date'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date',
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -52,6 +85,14 @@ class Post(models.Model):
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Комментарии с именем автора одним JOIN-запросом."""
+        return self.select_related('author').only(
+            'text', 'created', 'post', 'author__username'
+        )
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -74,8 +115,16 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created',
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -105,3 +154,106 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='subscription_unique'
             ),
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'], name='follow_author_user'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые поддерживают сигналы.
+
+    Страницы профиля и поста читают их вместо COUNT(*),
+    сверить с данными можно командой repair_counters.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return 'Счётчики {}'.format(self.user)
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Записи ленты вместе с постами, автором и группой одним запросом."""
+        post_fields = ['post__' + name for name in PostQuerySet.FEED_FIELDS]
+        return self.select_related('post__author', 'post__group').only(
+            'pub_date', 'post', *post_fields
+        )
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок пользователя.
+
+    Заполняется при публикации поста у всех подписчиков автора,
+    pub_date копируется из поста, чтобы лента читалась одним
+    проходом по индексу (user, pub_date, post).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='feed_entry_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_user_pub_date'
+            ),
+        ]
+
+
+class ImportedRecord(models.Model):
+    """Пост или комментарий, записанный командой import_data.
+
+    Связывает ключ записи в исходной системе (её id или, если id нет,
+    отпечаток содержимого) с id строки здесь: по нему повторный импорт
+    узнаёт уже записанное, а комментарии находят свой пост.
+    """
+
+    record_type = models.CharField('Тип записи', max_length=16)
+    source_key = models.CharField('Ключ в исходной системе', max_length=64)
+    local_id = models.PositiveIntegerField('id записи')
+
+    class Meta:
+        verbose_name = 'Импортированная запись'
+        verbose_name_plural = 'Импортированные записи'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['record_type', 'source_key'],
+                name='imported_record_unique'
+            ),
+        ]
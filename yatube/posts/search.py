@@ -0,0 +1,158 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_post_fts хранит копию текста постов (rowid = id поста)
+и обновляется сигналами из posts.signals. Результаты упорядочены
+по bm25, страницы листаются курсором по (rank, id) без OFFSET.
+Изменения в обход save() (queryset.update, загрузка фикстур сырыми
+запросами) в индекс не попадают: для них есть команда
+rebuild_search_index.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERMS = 16
+SNIPPET_TOKENS = 24
+# Символы из области частного использования Unicode отмечают совпадения
+# в сниппете: текст экранируется целиком и только потом они
+# превращаются в теги <mark>.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+TERM_RE = re.compile(r'\w+')
+
+SearchHit = namedtuple('SearchHit', ('id', 'rank', 'snippet'))
+
+SEARCH_SQL = (
+    f'SELECT rowid, rank, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+    f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {{seek}} '
+    'ORDER BY rank {rank_order}, rowid {id_order} LIMIT %s OFFSET %s'
+)
+# Ключ (rank, id): меньший rank релевантнее, при равенстве выше новые.
+SEEK_AFTER = 'AND (rank > %s OR (rank = %s AND rowid < %s))'
+SEEK_BEFORE = 'AND (rank < %s OR (rank = %s AND rowid > %s))'
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение FTS5 или None, если искать нечего.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 из ввода
+    не интерпретируются; последнее слово ищется как префикс.
+    """
+    terms = TERM_RE.findall(query or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def matching_ids(expression):
+    """Подзапрос с id постов, подходящих под выражение."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (expression,)
+    )
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def rebuild_index():
+    """Заполняет индекс заново из posts_post, возвращает число постов."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+        return cursor.rowcount
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсоры по результатам поиска.
+
+    object_list — выражение FTS5 из match_expression. rank зависит от
+    статистики всего индекса, поэтому после добавления постов курсор
+    может сдвинуться на несколько результатов, как и любая лента
+    с новыми записями.
+    """
+
+    date_field = 'rank'
+    pk_field = 'id'
+
+    def dump_key(self, value):
+        return repr(value)
+
+    def load_key(self, raw):
+        return float(raw)
+
+    def _hits(self, limit, offset=0, seek='', seek_params=(),
+              reverse=False):
+        sql = SEARCH_SQL.format(
+            seek=seek,
+            rank_order='DESC' if reverse else 'ASC',
+            id_order='ASC' if reverse else 'DESC',
+        )
+        params = [
+            MARK_START, MARK_END, '…', SNIPPET_TOKENS,
+            self.object_list, *seek_params, limit, offset,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+    def rows_from(self, offset, limit):
+        return self._hits(limit, offset)
+
+    def rows_after(self, rank, pk, limit):
+        return self._hits(
+            limit, seek=SEEK_AFTER, seek_params=(rank, rank, pk)
+        )
+
+    def rows_before(self, rank, pk, limit):
+        return self._hits(
+            limit, seek=SEEK_BEFORE, seek_params=(rank, rank, pk),
+            reverse=True,
+        )
+
+    def to_objects(self, rows):
+        posts = Post.objects.for_feed().in_bulk([row.id for row in rows])
+        page = []
+        for row in rows:
+            post = posts.get(row.id)
+            if post is not None:
+                post.search_snippet = highlight(row.snippet)
+                page.append(post)
+        return page
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import deferred
+
+from . import counters, feeds, search
+from .caching import bump_generation_on_commit
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def _invalidate_timeline(author_id):
+    # До фиксации параллельный запрос движка merge мог бы снова
+    # закэшировать ленту автора без изменения, поэтому кэш сбрасывается
+    # и сейчас, и после фиксации транзакции.
+    feeds.invalidate_timeline(author_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: feeds.invalidate_timeline(author_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields, **kwargs):
+    bump_generation_on_commit()
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    if not created:
+        return
+    counters.change_user_counter(instance.author_id, 'posts_count', 1)
+    _invalidate_timeline(instance.author_id)
+    if feeds.engine() == feeds.MATERIALIZED:
+        deferred.after_response(feeds.fan_out_post, instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_generation_on_commit()
+    search.unindex_post(instance.pk)
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    _invalidate_timeline(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    bump_generation_on_commit()
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_generation_on_commit()
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    bump_generation_on_commit()
+    counters.change_user_counter(instance.author_id, 'followers_count', 1)
+    counters.change_user_counter(instance.user_id, 'following_count', 1)
+    if feeds.engine() == feeds.MATERIALIZED:
+        deferred.after_response(
+            feeds.backfill_feed, instance.user_id, instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_generation_on_commit()
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    if feeds.engine() == feeds.MATERIALIZED:
+        feeds.drop_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_generation_on_commit()
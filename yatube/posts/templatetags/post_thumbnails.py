@@ -0,0 +1,21 @@
+from django import template
+
+from ..thumbnails import prefetch_thumbnails as _prefetch_thumbnails
+from ..thumbnails import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size='card'):
+    """{% post_thumbnail post.image 'card' as im %} — готовая миниатюра
+    или None, пока она создаётся в фоне."""
+    return ready_thumbnail(image, size)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, size='card'):
+    """{% prefetch_thumbnails page_obj %} перед циклом по постам:
+    миниатюры всей страницы читаются из хранилища одним запросом."""
+    _prefetch_thumbnails(posts, size)
+    return ''
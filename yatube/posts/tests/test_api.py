@@ -0,0 +1,128 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import COUNTER_POSTS
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(COUNTER_POSTS + 2)
+        ]
+        Comment.objects.create(
+            author=cls.reader, post=cls.posts[-1], text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def get(self, name, params=None, client=None, **kwargs):
+        client = client or self.client
+        return client.get(reverse(f'api:{name}', kwargs=kwargs), params)
+
+    def test_feeds_are_paginated_by_cursor(self):
+        for name, kwargs in (
+            ('index', {}),
+            ('group_posts', {'slug': self.group.slug}),
+            ('profile', {'username': self.user.username}),
+        ):
+            with self.subTest(name=name):
+                first = self.get(name, **kwargs).json()
+                self.assertEqual(len(first['results']), COUNTER_POSTS)
+                self.assertIsNone(first['previous_cursor'])
+                second = self.get(
+                    name, {'cursor': first['next_cursor']}, **kwargs
+                ).json()
+                self.assertEqual(
+                    [post['id'] for post in second['results']],
+                    [post.id for post in self.posts[1::-1]]
+                )
+
+    def test_sparse_fields(self):
+        data = self.get('index', {'fields': 'text,id'}).json()
+        self.assertEqual(
+            data['results'][0], {'id': self.posts[-1].id, 'text': 'Пост 11'}
+        )
+        response = self.get('index', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_post_detail_and_comments(self):
+        post = self.posts[-1]
+        data = self.get('post_detail', post_id=post.id).json()
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['author_name'], 'Лев Толстой')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comments_count'], 1)
+        comments = self.get('post_comments', post_id=post.id).json()
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        response = self.get('post_detail', post_id=0)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_follow_feed(self):
+        response = self.get('follow_index')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        Follow.objects.create(user=self.reader, author=self.user)
+        data = self.get('follow_index', client=self.reader_client).json()
+        self.assertEqual(len(data['results']), COUNTER_POSTS)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_cold_cache_fits_budget(self):
+        """Чтение миниатюр при пустом кэше входит в бюджеты API."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='С картинкой',
+            image='posts/api.gif',
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        for name, kwargs in (
+            ('index', {}),
+            ('group_posts', {'slug': self.group.slug}),
+            ('profile', {'username': self.user.username}),
+            ('post_detail', {'post_id': post.id}),
+            ('follow_index', {}),
+        ):
+            with self.subTest(name=name):
+                cache.clear()
+                response = self.get(name, client=self.reader_client, **kwargs)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn('thumbnail', response.json().get(
+                    'results', [response.json()]
+                )[0])
+
+    def test_queries_do_not_depend_on_page_size(self):
+        '''Страница API стоит фиксированное число запросов.'''
+        def count(params):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.get('index', params)
+            return len(queries)
+
+        single = count({'cursor': self.get('index').json()['next_cursor']})
+        self.assertEqual(count({}), single)
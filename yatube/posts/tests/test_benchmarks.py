@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import benchmarks
+from ..models import Comment, FeedEntry, Post
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.build_dataset(200)
+
+    def test_build_dataset(self):
+        """Набор данных собран и согласован: ленты и счётчики готовы."""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user__username=benchmarks.BENCH_USERNAME
+            ).exists()
+        )
+
+    def test_run_benchmark(self):
+        """Каждая страница отвечает и получает метрики с числом запросов."""
+        cache.set('bench:kept', 'значение')
+        comments = Comment.objects.count()
+        results = benchmarks.run_benchmark(requests=3)
+        self.assertEqual(cache.get('bench:kept'), 'значение')
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(results['posts'], 200)
+        self.assertEqual(
+            set(results['scenarios']),
+            {scenario.name for scenario in benchmarks.SCENARIOS},
+        )
+        for metrics in results['scenarios'].values():
+            self.assertGreater(metrics['queries'], 0)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+            self.assertGreaterEqual(metrics['peak_rss_growth_mb'], 0)
+
+    def test_compare(self):
+        """Рост задержки сверх допуска и любой рост запросов — регрессии."""
+        baseline = {'scenarios': {
+            'index': {'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'queries': 3},
+        }}
+        results = {'scenarios': {
+            'index': {'p50_ms': 11, 'p95_ms': 30, 'p99_ms': 30, 'queries': 4},
+            'profile': {'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'queries': 1},
+        }}
+        self.assertEqual(
+            benchmarks.compare(results, baseline, tolerance=0.2),
+            [('index', 'p95_ms', 20, 30), ('index', 'queries', 3, 4)],
+        )
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='writer')
+
+    def _stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счётчик постов автора следует за созданием и удалением."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self._stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self._stats(self.author).posts_count, 1)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста следует за комментариями."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики подписчиков и подписок."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self._stats(self.author).followers_count, 1)
+        self.assertEqual(self._stats(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(self._stats(self.author).followers_count, 0)
+        self.assertEqual(self._stats(self.user).following_count, 0)
+
+    def test_repair_command(self):
+        """Команда восстанавливает счётчики и недостающие записи."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.filter(user=self.user).delete()
+        UserStats.objects.update(posts_count=7, followers_count=7)
+        Post.objects.update(comments_count=7)
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self._stats(self.author).posts_count, 1)
+        self.assertEqual(self._stats(self.author).followers_count, 1)
+        self.assertEqual(self._stats(self.user).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_pages_do_not_count(self):
+        """Профиль и пост не выполняют COUNT(*)."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        urls = {
+            reverse('posts:profile', kwargs={'username': 'writer'}):
+                'Всего постов: 1',
+            reverse('posts:post_detail', kwargs={'post_id': post.id}):
+                '<span >1</span>',
+        }
+        for url, expected in urls.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url)
+                self.assertContains(response, expected)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
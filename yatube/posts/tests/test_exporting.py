@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост "{i}",\n')
+            for i in range(5)
+        ]
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            author=cls.user, post=cls.posts[0], text='Свой комментарий'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse(
+            'posts:profile_export', kwargs={'username': self.user.username}
+        )
+
+    def read(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    @mock.patch('posts.exporting.EXPORT_CHUNK_SIZE', 2)
+    def test_export_jsonl(self):
+        """Выгрузка содержит все посты и комментарии автора по порядку."""
+        response = self.client.get(self.url, {'format': 'jsonl'})
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        records = [
+            json.loads(line) for line in self.read(response).splitlines()
+        ]
+        self.assertEqual(
+            [record['id'] for record in records if record['type'] == 'post'],
+            [post.id for post in self.posts]
+        )
+        self.assertEqual(records[-1]['type'], 'comment')
+        self.assertEqual(records[-1]['post'], self.posts[0].id)
+
+    def test_export_csv(self):
+        lines = self.read(self.client.get(self.url, {'format': 'csv'}))
+        self.assertTrue(lines.startswith('type,id,author,group,post,text'))
+        self.assertIn('"Пост ""0"",\n"', lines)
+
+    def test_only_own_export(self):
+        url = reverse('posts:profile_export', kwargs={'username': 'other'})
+        self.assertRedirects(
+            self.client.get(url),
+            reverse('posts:profile', kwargs={'username': 'other'})
+        )
+
+    def test_export_command_round_trip(self):
+        """Выгрузку команды export_author принимает import_data."""
+        expected = list(
+            Post.objects.filter(author=self.user)
+            .values_list('text', 'pub_date')
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'author.jsonl')
+            call_command('export_author', 'author', '--output', path)
+            Post.objects.filter(author=self.user).delete()
+            call_command('import_data', path, stdout=StringIO())
+        self.assertEqual(
+            list(
+                Post.objects.filter(author=self.user)
+                .values_list('text', 'pub_date')
+            ),
+            expected
+        )
+        post = Post.objects.get(text=self.posts[0].text)
+        self.assertEqual(post.comments.get().text, 'Свой комментарий')
@@ -0,0 +1,248 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import deferred
+
+from .. import feeds
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def _feed(self):
+        return list(
+            FeedEntry.objects.filter(user=self.user)
+            .values_list('post_id', flat=True)
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.other)
+        self.assertEqual(self._feed(), [post.id])
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        """Подписка добавляет прошлые посты, отписка их убирает."""
+        old = Post.objects.create(text='Старый пост', author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'writer'})
+        )
+        self.assertEqual(self._feed(), [old.id])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'writer'})
+        )
+        self.assertEqual(self._feed(), [])
+
+    @override_settings(FOLLOW_FEED_MAX_ENTRIES=3)
+    def test_backfill_is_capped(self):
+        """Лента хранит не больше FOLLOW_FEED_MAX_ENTRIES записей."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(5)
+        ]
+        Follow.objects.create(user=self.user, author=self.author)
+        expected = [post.id for post in reversed(posts)][:3]
+        self.assertEqual(self._feed(), expected)
+
+    @override_settings(FOLLOW_FEED_MAX_ENTRIES=5)
+    def test_fan_out_is_capped(self):
+        """Рассылка новых постов тоже обрезает ленты до предела."""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(10)
+        ]
+        expected = [post.id for post in reversed(posts)][:5]
+        self.assertEqual(self._feed(), expected)
+
+    @mock.patch.object(feeds, 'FAN_OUT_BATCH', 2)
+    def test_fan_out_in_batches(self):
+        readers = [
+            User.objects.create_user(username=f'reader_{i}') for i in range(5)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(
+            FeedEntry.objects.filter(post=post).count(), len(readers)
+        )
+
+    def test_fan_out_after_response(self):
+        """Пост из формы рассылается уже после ответа, вне вида."""
+        Follow.objects.create(user=self.user, author=self.author)
+        author_client = Client()
+        author_client.force_login(self.author)
+        with mock.patch.object(
+            feeds, 'fan_out_post', wraps=feeds.fan_out_post
+        ) as fan_out:
+            with mock.patch(
+                'core.deferred.after_response',
+                wraps=deferred.after_response,
+            ) as after_response:
+                response = author_client.post(
+                    reverse('posts:post_create'), data={'text': 'Из формы'}
+                )
+        self.assertEqual(response.status_code, 302)
+        after_response.assert_called_once()
+        fan_out.assert_called_once()
+        self.assertEqual(
+            self._feed(), [Post.objects.get(text='Из формы').id]
+        )
+
+    def test_follow_index_reads_feed(self):
+        """Страница подписок показывает посты из материализованной ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_rebuild_command(self):
+        """Команда пересобирает ленты из подписок."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_follow_feeds', stdout=StringIO())
+        self.assertEqual(self._feed(), [post.id])
+
+    @override_settings(FOLLOW_FEED_MAX_ENTRIES=3)
+    def test_rebuild_all_matches_rebuild_feed(self):
+        """Все ленты одним запросом — то же, что по одной, с обрезкой."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.other)
+        Follow.objects.create(user=self.other, author=self.author)
+        for i in range(4):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            Post.objects.create(text=f'Чужой пост {i}', author=self.other)
+
+        def feeds_snapshot():
+            return sorted(
+                FeedEntry.objects.values_list('user_id', 'post_id', 'pub_date')
+            )
+
+        for user in (self.user, self.author, self.other):
+            feeds.rebuild_feed(user.id)
+        expected = feeds_snapshot()
+        feeds.rebuild_all_feeds()
+        self.assertEqual(feeds_snapshot(), expected)
+        self.assertEqual(len(self._feed()), 3)
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge')
+class MergeFollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        authors = [
+            User.objects.create_user(username=f'writer_{i}')
+            for i in range(3)
+        ]
+        for author in authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+        for i in range(30):
+            Post.objects.create(
+                text=f'Пост {i}', author=authors[i % 3],
+                image=f'posts/{i}.gif' if i % 2 else '',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def _pages(self):
+        pages, params = [], {}
+        while True:
+            page = self.authorized_client.get(
+                reverse('posts:follow_index'), params
+            ).context['page_obj']
+            pages.append(list(page))
+            if not page.has_next():
+                return pages
+            params = {'cursor': page.next_cursor}
+
+    def test_merge_matches_join(self):
+        """Слияние лент авторов даёт ту же ленту, что и JOIN."""
+        merged = self._pages()
+        with override_settings(FOLLOW_FEED_ENGINE='join'):
+            joined = self._pages()
+        self.assertEqual(merged, joined)
+        self.assertEqual([len(page) for page in merged], [10, 10])
+
+    def test_warm_merge_does_not_join_posts(self):
+        """С прогретым кэшем лента не соединяет Follow и Post."""
+        self._pages()
+        with CaptureQueriesContext(connection) as queries:
+            self._pages()
+        for query in queries.captured_queries:
+            sql = query['sql']
+            self.assertFalse('posts_follow' in sql and 'posts_post' in sql)
+
+    def test_new_post_invalidates_timeline(self):
+        """Новый пост автора сразу виден в ленте."""
+        self._pages()
+        author = Follow.objects.filter(user=self.user).first().author
+        post = Post.objects.create(text='Свежий пост', author=author)
+        self.assertEqual(self._pages()[0][0], post)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_cold_cache_fits_budget_of_every_engine(self):
+        """Лента с пустым кэшем лент авторов и миниатюр укладывается
+        в бюджет запросов при любом движке."""
+        for engine in (feeds.MATERIALIZED, feeds.MERGE, feeds.JOIN):
+            for url in ('posts:follow_index', 'api:follow_index'):
+                with self.subTest(engine=engine, url=url):
+                    cache.clear()
+                    with override_settings(FOLLOW_FEED_ENGINE=engine):
+                        response = self.authorized_client.get(reverse(url))
+                    self.assertEqual(response.status_code, 200)
+
+    @override_settings(FOLLOW_FEED_ENGINE='unknown')
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge')
+class TimelineCommitTests(TransactionTestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_timeline_cached_before_commit_is_dropped(self):
+        """Лента автора, закэшированная до фиксации нового поста,
+        сбрасывается после фиксации."""
+        author = User.objects.create_user(username='writer')
+        key = feeds.TIMELINE_KEY.format(author.id)
+        with transaction.atomic():
+            Post.objects.create(text='Пост', author=author)
+            # Параллельный запрос перечитал ленту без нового поста.
+            cache.set(key, [])
+        self.assertIsNone(cache.get(key))
@@ -0,0 +1,99 @@
+from collections import Counter
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from ..generating import GenerationConflict, Generator
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class GeneratorTests(TestCase):
+    def generate(self, seed=0, **options):
+        return Generator(
+            users=200, posts=2000, comments=3000, follows=1000, groups=5,
+            seed=seed, batch_size=300, **options,
+        ).run()
+
+    def test_rows_written(self):
+        """Таблицы получают запрошенное число строк, ссылки целы."""
+        written = self.generate()
+        self.assertEqual(User.objects.count(), 200)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 2000)
+        self.assertEqual(Comment.objects.count(), 3000)
+        self.assertEqual(Follow.objects.count(), written['follow'])
+        self.assertGreater(written['follow'], 500)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F('post__pub_date')).exists()
+        )
+        self.assertFalse(User.objects.first().has_usable_password())
+
+    def test_skew(self):
+        """Посты и подписчики сосредоточены у немногих пользователей."""
+        self.generate()
+        posts = sorted(
+            Counter(Post.objects.values_list('author_id', flat=True))
+            .values(), reverse=True
+        )
+        self.assertGreater(sum(posts[:20]), 2000 * 0.4)
+        followers = Counter(Follow.objects.values_list('author_id', flat=True))
+        self.assertGreater(
+            max(followers.values()), 10 * Follow.objects.count() / 200
+        )
+
+    def test_deterministic(self):
+        """Один seed — одни и те же данные."""
+        anchor = timezone.make_aware(datetime(2024, 1, 1))
+
+        def snapshot(seed):
+            with transaction.atomic():
+                self.generate(seed, anchor=anchor)
+                rows = (
+                    list(Post.objects.values_list(
+                        'id', 'author_id', 'group_id', 'text', 'pub_date'
+                    )),
+                    list(Comment.objects.values_list('created', flat=True)),
+                    list(Follow.objects.values_list('user_id', 'author_id')),
+                )
+                transaction.set_rollback(True)
+            return rows
+
+        self.assertEqual(snapshot(1), snapshot(1))
+        self.assertNotEqual(snapshot(1), snapshot(2))
+
+    def test_existing_names_are_not_reused(self):
+        """Строки прошлых прогонов не мешают новому, а занятый префикс —
+        отказ до записи строк."""
+        first = Generator(users=5, posts=10, groups=2)
+        first.run()
+        written = Generator(users=5, posts=10, groups=2).run()
+        self.assertEqual(written['user'], 5)
+        self.assertEqual(Group.objects.count(), 4)
+        with self.assertRaises(GenerationConflict):
+            Generator(users=5, posts=10, groups=2, prefix=first.prefix).run()
+        self.assertEqual(User.objects.count(), 10)
+
+    def test_command_finalizes(self):
+        """Команда досчитывает счётчики после генерации."""
+        call_command(
+            'generate_data', users=50, posts=300, comments=400, follows=100,
+            stdout=StringIO(),
+        )
+        self.assertEqual(UserStats.objects.count(), 50)
+        stats = UserStats.objects.order_by('-posts_count').first()
+        self.assertEqual(
+            stats.posts_count,
+            Post.objects.filter(author_id=stats.user_id).count(),
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 400
+        )
@@ -0,0 +1,101 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..images import ORIENTATION_TAG, normalize_image, normalize_upload
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_jpeg(size, orientation=1):
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    output = io.BytesIO()
+    Image.new('RGB', size, 'red').save(
+        output, 'JPEG', exif=exif.tobytes()
+    )
+    return output.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIZE=(100, 100),
+    POST_IMAGE_WORKERS=0,
+)
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_downscale_rotate_and_strip(self):
+        """Картинка уменьшается, поворачивается и теряет EXIF."""
+        data = normalize_image(make_jpeg((400, 200), orientation=6),
+                               (100, 100), 85)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.getexif())
+
+    def test_small_clean_image_is_untouched(self):
+        output = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(output, 'PNG')
+        self.assertIsNone(normalize_image(output.getvalue(), (100, 100), 85))
+
+    def test_create_post_stores_normalized_image(self):
+        """Форма поста сохраняет уже нормализованную картинку."""
+        user = User.objects.create_user(username='NoName')
+        client = Client()
+        client.force_login(user)
+        upload = SimpleUploadedFile(
+            'photo.jpg', make_jpeg((300, 150)), content_type='image/jpeg'
+        )
+        client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': upload},
+        )
+        post = Post.objects.get(text='Пост с фото')
+        self.assertEqual((post.image.width, post.image.height), (100, 50))
+
+    def _form(self, data):
+        upload = SimpleUploadedFile(
+            'photo.jpg', data, content_type='image/jpeg'
+        )
+        return PostForm({'text': 'Пост'}, files={'image': upload})
+
+    def test_truncated_image_is_invalid(self):
+        """Обрезанный файл проходит проверку Django, но не нормализацию:
+        форма сообщает об ошибке вместо исключения."""
+        data = make_jpeg((300, 150), orientation=6)
+        form = self._form(data[:len(data) // 2])
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'invalid_image')
+
+    def test_decompression_bomb_is_invalid(self):
+        form = self._form(make_jpeg((300, 150)))
+        with mock.patch(
+            'posts.forms.normalize_upload',
+            side_effect=Image.DecompressionBombError('слишком велика'),
+        ):
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_WORKERS=1)
+    def test_process_pool(self):
+        """Нормализация в пуле процессов даёт тот же результат."""
+        upload = SimpleUploadedFile(
+            'photo.jpg', make_jpeg((300, 150)), content_type='image/jpeg'
+        )
+        with Image.open(normalize_upload(upload)) as image:
+            self.assertEqual(image.size, (100, 50))
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..importing import Importer, jsonl_records
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+RECORDS = [
+    {'type': 'user', 'username': 'leo', 'first_name': 'Лев'},
+    {'type': 'user', 'username': 'anna'},
+    {'type': 'group', 'slug': 'books', 'title': 'Книги', 'description': '-'},
+    {'type': 'post', 'id': 7, 'author': 'leo', 'group': 'books',
+     'text': 'Война и мир', 'pub_date': '1869-01-01T12:00:00'},
+    {'type': 'post', 'author': 'ghost', 'text': 'Без автора'},
+    {'type': 'comment', 'post': 7, 'author': 'anna', 'text': 'Длинно',
+     'created': '1870-01-01T12:00:00'},
+    {'type': 'follow', 'user': 'anna', 'author': 'leo'},
+]
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'data.jsonl')
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            for record in RECORDS:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            stream.write('{битая строка\n\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def import_data(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_data', self.path, '--batch-size', '2', *args,
+            stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_jsonl(self):
+        """Записи импортируются с исходными датами, битые отбрасываются,
+        пустые строки пропускаются."""
+        stdout, stderr = self.import_data()
+        post = Post.objects.get(text='Война и мир')
+        self.assertEqual(post.pub_date.year, 1869)
+        self.assertEqual(post.group.slug, 'books')
+        self.assertEqual(post.comments_count, 1)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.author.username, 'anna')
+        self.assertEqual(comment.created.year, 1870)
+        self.assertTrue(
+            Follow.objects.filter(user__username='anna').exists()
+        )
+        self.assertEqual(User.objects.get(username='leo').stats.posts_count, 1)
+        self.assertIn("Строка 5: нет пользователя 'ghost'", stderr)
+        self.assertIn('Строка 8: не JSON', stderr)
+        self.assertIn('ошибок: 2', stdout)
+        response = self.client.get('/search/', {'q': 'война'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_resume_from_checkpoint(self):
+        """Повторный запуск продолжает с сохранённой строки."""
+        checkpoint = os.path.join(self.directory.name, 'checkpoint')
+        with open(self.path, encoding='utf-8') as stream:
+            Importer(batch_size=2, checkpoint=checkpoint).run(
+                record for _, record in zip(range(2), jsonl_records(stream))
+            )
+        self.assertEqual(User.objects.count(), 2)
+        User.objects.filter(username='anna').delete()
+        self.import_data('--checkpoint', checkpoint)
+        self.assertFalse(User.objects.filter(username='anna').exists())
+        self.assertTrue(Group.objects.exists())
+        self.assertTrue(Post.objects.filter(text='Война и мир').exists())
+
+    def test_repeated_import_is_idempotent(self):
+        """Повтор не размножает строки и не засчитывает пропущенные."""
+        stdout, _ = self.import_data()
+        self.assertIn('user: 2, group: 1, post: 1, comment: 1, follow: 1',
+                      stdout)
+        stdout, _ = self.import_data('--restart')
+        self.assertIn('user: 0, group: 0, post: 0, comment: 0, follow: 0',
+                      stdout)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_source_ids_do_not_collide_with_local(self):
+        """Пост с id, занятым здесь другим постом, получает свой id,
+        а его комментарии не уходят к чужому посту."""
+        author = User.objects.create_user(username='local')
+        local = Post.objects.create(id=7, author=author, text='Местный')
+        self.import_data()
+        imported = Post.objects.get(text='Война и мир')
+        self.assertNotEqual(imported.pk, local.pk)
+        self.assertEqual(Comment.objects.get().post, imported)
+        self.assertFalse(local.comments.exists())
+
+    def test_counts_without_table_scans(self):
+        """Записанные строки считаются без COUNT(*) по таблицам."""
+        with open(self.path, encoding='utf-8') as stream:
+            with CaptureQueriesContext(connection) as queries:
+                written = Importer(batch_size=2).run(jsonl_records(stream))
+        self.assertEqual(written['post'], 1)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ])
+
+    def test_import_csv(self):
+        path = os.path.join(self.directory.name, 'users.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            stream.write('username,email\nivan,ivan@example.com\n,x@y.z\n')
+        call_command(
+            'import_data', path, '--type', 'user',
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        self.assertEqual(
+            list(User.objects.values_list('username', 'email')),
+            [('ivan', 'ivan@example.com')]
+        )
@@ -0,0 +1,196 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.budgets import QueryLog
+
+from .. import feeds
+from ..models import Comment, Follow, Group, Post
+from ..utils import COMMENTS_PER_PAGE, COUNTER_POSTS
+
+User = get_user_model()
+TABLES = ('posts_post', 'posts_comment', 'posts_follow', 'posts_feedentry')
+# Просмотр таблицы целиком — «SCAN <таблица>», с индексом или без:
+# «SCAN posts_post USING INDEX …» так же читает весь индекс.
+FULL_SCAN = re.compile(
+    r'SCAN (?P<table>\w+)(?: AS \w+)?'
+    r'(?: USING (?:COVERING )?INDEX (?P<index>\w+))?'
+)
+# Индексы, обход которых по порядку допустим в запросе без WHERE,
+# который останавливает LIMIT (первые страницы общей ленты).
+ORDERED_SCANS = {
+    ('posts_post', 'post_pub_date'),
+}
+# Страница по курсору начинается в индексе с ключа курсора.
+SEEK = re.compile(
+    r'SEARCH \w+ USING (?:COVERING )?INDEX \w+ '
+    r'\(.*(?:pub_date|created)[<>]\?\)'
+)
+SEEK_SQL = re.compile(r'"(?:pub_date|created)" [<>]=? ')
+# Статистика ANALYZE с базы в 100 000 постов от 2000 авторов: на ней
+# планировщик выбирает план так же, как на боевых объёмах.
+PRODUCTION_STATS = (
+    ('posts_post', 'post_pub_date', '100000 1 1'),
+    ('posts_post', 'post_author_pub_date', '100000 50 1 1'),
+    ('posts_post', 'post_group_pub_date', '100000 4762 1 1'),
+    ('posts_post', 'posts_post_author_id_fe5487bf', '100000 50'),
+    ('posts_post', 'posts_post_group_id_c91a8485', '100000 4762'),
+    ('auth_user', 'sqlite_autoindex_auth_user_1', '2001 1'),
+    ('posts_group', 'sqlite_autoindex_posts_group_1', '20 1'),
+    ('posts_feedentry', 'feed_entry_user_pub_date', '1000000 1000 1 1'),
+    ('posts_feedentry', 'posts_feedentry_user_id_00a96a78', '1000000 1000'),
+)
+
+
+def query_plan(sql, params=None):
+    # План берётся с параметрами, как у настоящего запроса: значения,
+    # подставленные в текст, SQLite планирует иначе.
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент и комментариев идут по индексам без сортировки
+    во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(COUNTER_POSTS + 2)
+        ]
+        for i in range(COMMENTS_PER_PAGE + 1):
+            Comment.objects.create(
+                author=cls.reader, post=cls.posts[-1], text=f'Ответ {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def assert_plans_use_indexes(self, url):
+        context = self.client.get(url).context
+        page_obj = context.get('page_obj') or context.get('comments')
+        cursor = page_obj.next_cursor or ''
+        for params in ({}, {'page': 2}, {'cursor': cursor}):
+            cache.clear()
+            log = QueryLog()
+            with connection.execute_wrapper(log):
+                self.client.get(url, params)
+            for sql, query_params, _ in log.queries:
+                if not sql.startswith('SELECT') or not any(
+                    table in sql for table in TABLES
+                ):
+                    continue
+                plan = query_plan(sql, query_params)
+                with self.subTest(url=url, sql=sql, plan=plan):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        self.assert_not_full_scan(step, sql)
+
+    def assert_not_full_scan(self, step, sql):
+        match = FULL_SCAN.match(step)
+        if not match or match.group('table') not in TABLES:
+            return
+        ordered = (match.group('table'), match.group('index')) in ORDERED_SCANS
+        self.assertTrue(
+            ordered and 'WHERE' not in sql and 'LIMIT' in sql, step
+        )
+
+    def test_feeds(self):
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ):
+            self.assert_plans_use_indexes(url)
+
+    def test_follow_feed_engines(self):
+        # Движок JOIN сортирует посты нескольких авторов во временном
+        # B-дереве при любых индексах, поэтому здесь не проверяется.
+        url = reverse('posts:follow_index')
+        for engine in (feeds.MATERIALIZED, feeds.MERGE):
+            with override_settings(FOLLOW_FEED_ENGINE=engine):
+                self.assert_plans_use_indexes(url)
+
+    def test_post_detail_and_comments(self):
+        post_id = self.posts[-1].id
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', kwargs={'post_id': post_id})
+        )
+        self.assert_plans_use_indexes(
+            reverse('posts:post_comments', kwargs={'post_id': post_id})
+        )
+
+    def use_production_stats(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.executemany(
+                'DELETE FROM sqlite_stat1 WHERE tbl = %s AND idx = %s',
+                [(table, index) for table, index, _ in PRODUCTION_STATS]
+            )
+            cursor.executemany(
+                'INSERT INTO sqlite_stat1 VALUES (%s, %s, %s)',
+                PRODUCTION_STATS
+            )
+            # Планировщик перечитывает статистику.
+            cursor.execute('ANALYZE sqlite_master')
+        self.addCleanup(self.drop_stats)
+
+    def drop_stats(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM sqlite_stat1')
+            cursor.execute('ANALYZE sqlite_master')
+
+    def assert_cursor_seeks(self, url):
+        next_cursor = self.client.get(url).context['page_obj'].next_cursor
+        previous_cursor = self.client.get(
+            url, {'cursor': next_cursor}
+        ).context['page_obj'].previous_cursor
+        for cursor in (next_cursor, previous_cursor):
+            cache.clear()
+            log = QueryLog()
+            with connection.execute_wrapper(log):
+                self.client.get(url, {'cursor': cursor})
+            seeks = [
+                (sql, params) for sql, params, _ in log.queries
+                if SEEK_SQL.search(sql)
+            ]
+            self.assertTrue(seeks, url)
+            for sql, params in seeks:
+                plan = query_plan(sql, params)
+                with self.subTest(url=url, sql=sql, plan=plan):
+                    self.assertTrue(any(SEEK.match(step) for step in plan))
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+
+    def test_cursor_pages_seek_by_index(self):
+        """Глубокая страница стоит как первая: поиск по диапазону
+        индекса от ключа курсора, а не просмотр индекса целиком."""
+        self.use_production_stats()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ):
+            self.assert_cursor_seeks(url)
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..search import match_expression
+from ..utils import COUNTER_POSTS
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Ёжик <b>в тумане</b> искал лошадку'
+        )
+        Post.objects.create(author=cls.user, text='Совсем другой текст')
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+
+    def test_match_expression_ignores_operators(self):
+        self.assertEqual(
+            match_expression('туман OR "лошадь* NEAR('),
+            '"туман" "OR" "лошадь" "NEAR"*'
+        )
+        self.assertIsNone(match_expression(' ?! '))
+
+    def test_search_highlights_escaped_snippet(self):
+        """Найденный пост показан сниппетом с подсветкой и экранированием."""
+        response = self.search('ТУМАН')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertContains(response, '&lt;b&gt;в <mark>тумане</mark>')
+
+    def test_prefix_search(self):
+        response = self.search('лошад')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    def test_index_follows_edit_and_delete(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст про облака'
+        post.save()
+        self.assertFalse(self.search('туман').context['page_obj'])
+        self.assertEqual(
+            list(self.search('облака').context['page_obj']), [post]
+        )
+        post.delete()
+        self.assertFalse(self.search('облака').context['page_obj'])
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_authorized_search_fits_budget(self):
+        """Пользователь сессии, нужный шапке, не съедает бюджет поиска,
+        как и чтение миниатюр при пустом кэше."""
+        Post.objects.create(
+            author=self.user, text='Туман над рекой', image='posts/fog.gif'
+        )
+        cache.clear()
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:search'), {'q': 'туман'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_empty_query(self):
+        response = self.search('')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_cursor_pages(self):
+        """Курсоры проходят все результаты без повторов и пропусков."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'кот номер {i}')
+            for i in range(COUNTER_POSTS + 3)
+        ])
+        # bulk_create не шлёт сигналов, индекс догоняется вручную.
+        for post in Post.objects.filter(text__startswith='кот'):
+            post.save()
+        first = self.search('кот').context['page_obj']
+        self.assertTrue(first.has_next())
+        second = self.search('кот', cursor=first.next_cursor)
+        second = second.context['page_obj']
+        self.assertEqual(len(first) + len(second), COUNTER_POSTS + 3)
+        self.assertFalse(set(first) & set(second))
+        back = self.search('кот', cursor=second.previous_cursor)
+        self.assertEqual(list(back.context['page_obj']), list(first))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'тумане'}
+            )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post]
+        )
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('posts_post_fts', sql)
+        self.assertNotIn('LIKE', sql)
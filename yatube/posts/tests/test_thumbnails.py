@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import metrics
+
+from .. import thumbnails
+from ..caching import get_generation
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+IMG_TAG = '<img class="card-img my-2"'
+
+
+def _generated(result):
+    series = f'yatube_thumbnail_generation_seconds_count{{result="{result}"}}'
+    for line in metrics.render([metrics.registry.snapshot()]).splitlines():
+        if line.startswith(f'{series} '):
+            return float(line.split()[-1])
+    return 0
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='NoName')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def _upload(self, name):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def test_create_generates_thumbnails(self):
+        """Миниатюры создаются при сохранении поста."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': self._upload('created.gif')},
+        )
+        post = Post.objects.get(text='Пост')
+        thumbnail = thumbnails.ready_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, thumbnail.url)
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, вместо неё заглушка, а сама она ставится
+        в очередь."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=self._upload('plain.gif')
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, IMG_TAG)
+        self.assertContains(response, 'aspect-ratio')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, IMG_TAG)
+
+    def test_ready_thumbnail_keeps_generation(self):
+        """Готовая миниатюра не сбрасывает кэш всего сайта: меняется
+        только фрагмент ленты с заглушкой, а страница с заглушкой
+        приходит без ETag."""
+        Post.objects.create(
+            text='Пост', author=self.user, image=self._upload('feed.gif')
+        )
+        url = reverse('posts:index')
+        with mock.patch.object(thumbnails, '_submit'):
+            response = self.authorized_client.get(url)
+        self.assertNotContains(response, IMG_TAG)
+        self.assertFalse(response.has_header('ETag'))
+        generation = get_generation()
+        response = self.authorized_client.get(url)
+        self.assertEqual(get_generation(), generation)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, IMG_TAG)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_missing_source_is_not_retried(self):
+        """Битая картинка не ставится в очередь на каждом показе."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image='posts/missing.gif'
+        )
+        generated = _generated('missing')
+        thumbnails.ready_thumbnail(post.image, 'card')
+        self.assertIn('posts/missing.gif', thumbnails._failed)
+        self.assertEqual(thumbnails.pending_count(), 0)
+        self.assertEqual(_generated('missing'), generated + 1)
+
+    def test_feed_reads_thumbnails_in_one_query(self):
+        """Миниатюры страницы ленты читаются из базы одним запросом."""
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=self.user,
+                image=self._upload(f'feed_{i}.gif')
+            )
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(response.content.decode().count(IMG_TAG), 5)
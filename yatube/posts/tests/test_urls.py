@@ -1,8 +1,11 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, SimpleTestCase, TestCase
 
+from core.budgets import BUDGETS, view_name
+
+from .. import api_urls, urls
 from ..models import Group, Post
 
 User = get_user_model()
@@ -139,3 +142,11 @@ class StaticUrlTest(TestCase):
     def test_homepage(self):
         response = self.guest_client.get('/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class QueryBudgetUrlTest(SimpleTestCase):
+    def test_every_view_has_budget(self):
+        """У каждого вида постов и API объявлен бюджет запросов."""
+        for pattern in urls.urlpatterns + api_urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(view_name(pattern.callback), BUDGETS)
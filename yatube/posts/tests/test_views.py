@@ -1,11 +1,16 @@
 from http import HTTPStatus
 from django import forms
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Follow, Group, Post
+from ..caching import get_generation
+from ..models import Comment, Follow, Group, Post
+from ..utils import COMMENTS_PER_PAGE
 
 TEST_OF_POST: int = 13
 NUMB_FIRST_PAGE = 10
@@ -54,16 +59,22 @@ class ViewsTests(TestCase):
         cache.clear()
 
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
+        """Проверка хранения и сброса кэша для index."""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
-        Post.objects.create(text='Тестовый пост', author=self.user,)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         old_posts = self.authorized_client.get(reverse('posts:index')).content
         self.assertEqual(old_posts, posts)
-        cache.clear()
+        Post.objects.create(text='Новый пост', author=self.user,)
         new_posts = self.authorized_client.get(reverse('posts:index')).content
         self.assertNotEqual(old_posts, new_posts)
-        cache.clear()
+        self.assertIn('Новый пост', new_posts.decode())
+
+    def test_cache_key_depends_on_user_state(self):
+        """Гость и авторизованный пользователь не делят фрагмент index."""
+        self.authorized_client.get(reverse('posts:index'))
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Избранные авторы')
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -211,3 +222,229 @@ class PaginatorViewsTest(TestCase):
             error = (f'Ошибка: {count_posts} постов,'
                      f'должно {NUMB_SECOND_PAGE}')
             self.assertEqual(count_posts, NUMB_SECOND_PAGE, error)
+
+    def test_cursor_pages_guest_client(self):
+        '''Переход по курсорам вперёд и назад.'''
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        )
+        for value in urls:
+            with self.subTest(value=value):
+                first = self.guest_client.get(value).context['page_obj']
+                self.assertTrue(first.has_next())
+                self.assertFalse(first.has_previous())
+                second = self.guest_client.get(
+                    value, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), NUMB_SECOND_PAGE)
+                self.assertFalse(second.has_next())
+                self.assertTrue(second.has_previous())
+                self.assertFalse(
+                    set(first.object_list) & set(second.object_list)
+                )
+                back = self.guest_client.get(
+                    value, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(back.object_list, first.object_list)
+
+    def test_invalid_cursor_returns_first_page(self):
+        '''Битый курсор открывает первую страницу.'''
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        page = response.context['page_obj']
+        self.assertEqual(len(page), NUMB_FIRST_PAGE)
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_page_does_not_count_posts(self):
+        '''Страница по курсору не выполняет COUNT(*).'''
+        first = self.guest_client.get(
+            reverse('posts:index')).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('posts:index'), {'cursor': first.next_cursor}
+            )
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_cached_pages_differ(self):
+        """Вторая страница не отдаёт закэшированную первую."""
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(
+            reverse('posts:index'),
+            {'cursor': first.context['page_obj'].next_cursor}
+        )
+        self.assertNotEqual(first.content, second.content)
+        self.assertEqual(
+            second.content.decode().count('подробная информация'),
+            NUMB_SECOND_PAGE
+        )
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username})
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def _count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        '''Число запросов ленты не зависит от числа постов на странице.'''
+        Post.objects.create(text='Пост', group=self.group, author=self.user)
+        single = {url: self._count_queries(url) for url in self.urls}
+        for i in range(NUMB_FIRST_PAGE):
+            author = User.objects.create_user(username=f'author_{i}')
+            for post_author in (author, self.user):
+                Post.objects.create(
+                    text='Пост', group=self.group, author=post_author
+                )
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self._count_queries(url), single[url])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='author')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Пост', group=self.group, author=self.user
+        )
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        '''Актуальная версия у клиента — 304 без запросов к базе.'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_changes_invalidate_validators(self):
+        url = self.urls[-1]
+        etag = self.guest_client.get(url)['ETag']
+        self.post.comments.create(author=self.user, text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Комментарий')
+
+    def test_etag_depends_on_user(self):
+        url = self.urls[0]
+        etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_csrf_token(self):
+        '''После повторного входа токен CSRF новый, и страница с формой
+        комментария не берётся из кэша браузера со старым токеном.'''
+        url = self.urls[-1]
+        client = self.authorized_client
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class GenerationCommitTest(TransactionTestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_generation_bumped_again_after_commit(self):
+        '''Страница, закэшированная до фиксации изменений, устаревает
+        после фиксации; сброс после фиксации в транзакции один.'''
+        with transaction.atomic():
+            user = User.objects.create_user(username='author')
+            post = Post.objects.create(text='Пост', author=user)
+            Comment.objects.create(post=post, author=user, text='Текст')
+            # Параллельный запрос отрисовал страницу под этим поколением.
+            generation = get_generation()
+        self.assertEqual(get_generation(), generation + 1)
+
+
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, reverse('posts:post_comments', args=(self.post.id,))
+        )
+
+    def test_next_comments_fragment(self):
+        '''Следующая порция читается одним запросом вместе с авторами.'''
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        first = self.client.get(url).context['comments']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'cursor': first.next_cursor})
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertFalse(comments.has_next())
+        self.assertFalse(set(first) & set(comments))
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertNotContains(response, 'js-more-comments')
@@ -0,0 +1,240 @@
+"""Миниатюры картинок постов готовятся в фоне, а не при первом показе.
+
+post_create и post_edit ставят картинку в очередь пула потоков,
+шаблоны берут только уже готовую миниатюру из хранилища sorl
+и до её появления показывают заглушку.
+
+Готовая миниатюра не сбрасывает поколение данных: ключ фрагмента ленты
+учитывает готовность миниатюр её постов (caching.feed_cache), а ответ
+с заглушкой уходит без ETag и Last-Modified (caching.conditional_page),
+так что клиент не получит на него 304.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import deferred, metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = set()
+_failed = set()
+_executor = None
+_placeholders = ContextVar('thumbnail_placeholders', default=None)
+
+GENERATION_SECONDS = metrics.Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время создания миниатюр одной картинки: ok, missing или failed',
+    labels=('result',),
+)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def thumbnail_options(size):
+    geometry, options = settings.POST_THUMBNAIL_SIZES[size]
+    return geometry, dict(options)
+
+
+def generate(name):
+    """Создаёт миниатюры всех размеров из POST_THUMBNAIL_SIZES."""
+    start = time.perf_counter()
+    result = 'failed'
+    try:
+        # sorl не сообщает об отсутствующем исходнике, а только пишет в лог.
+        if not default.storage.exists(name):
+            raise FileNotFoundError(name)
+        for size in settings.POST_THUMBNAIL_SIZES:
+            geometry, options = thumbnail_options(size)
+            get_thumbnail(name, geometry, **options)
+        result = 'ok'
+    except FileNotFoundError:
+        logger.warning('Нет исходной картинки %s', name)
+        result = 'missing'
+        with _lock:
+            _failed.add(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        with _lock:
+            _failed.add(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        GENERATION_SECONDS.observe(
+            time.perf_counter() - start, result=result
+        )
+
+
+def _generate_in_worker(name):
+    try:
+        generate(name)
+    finally:
+        # Соединения с базой у каждого потока свои.
+        connections.close_all()
+
+
+def _submit(name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if settings.POST_THUMBNAIL_WORKERS:
+        _get_executor().submit(_generate_in_worker, name)
+    else:
+        deferred.after_response(generate, name)
+
+
+def enqueue(image):
+    """Ставит картинку в очередь после фиксации транзакции.
+
+    При POST_THUMBNAIL_WORKERS = 0 миниатюры создаются в том же потоке,
+    но после ответа, вне бюджета запросов вида.
+    """
+    if image:
+        name = image.name
+        with _lock:
+            _failed.discard(name)
+        transaction.on_commit(lambda: _submit(name))
+
+
+def pending_count():
+    with _lock:
+        return len(_pending)
+
+
+metrics.Gauge(
+    'yatube_thumbnail_queue_depth',
+    'Картинки в очереди на создание миниатюр',
+    pending_count,
+)
+
+
+def _thumbnail_file(source, geometry, options):
+    # Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+    # чтобы получить то же имя файла, не создавая миниатюру.
+    backend = default.backend
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+@contextmanager
+def track_placeholders():
+    """Собирает имена картинок, вместо миниатюр которых внутри with
+    показана заглушка."""
+    names = []
+    token = _placeholders.set(names)
+    try:
+        yield names
+    finally:
+        _placeholders.reset(token)
+
+
+def _queue_missing(image):
+    names = _placeholders.get()
+    if names is not None:
+        names.append(image.name)
+    # Картинки, загруженные до фоновой обработки, догоняются здесь.
+    if image.name not in _failed:
+        transaction.on_commit(lambda: _submit(image.name))
+
+
+def _read_kvstore(thumbnails):
+    """Записи хранилища sorl для списка миниатюр одним чтением.
+
+    Для cached_db-хранилища это один get_many из кэша и, для промахов,
+    один запрос к базе; промахи кэшируются так же, как это делает sorl.
+    """
+    kvstore = default.kvstore
+    empty = cached_db_kvstore.EMPTY_VALUE
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return [kvstore.get(thumbnail) for thumbnail in thumbnails]
+    keys = [add_prefix(thumbnail.key) for thumbnail in thumbnails]
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        fetched = {key: stored.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return [
+        deserialize_image_file(values[key])
+        if values[key] and values[key] != empty else None
+        for key in keys
+    ]
+
+
+def prefetch_thumbnails(posts, size):
+    """Находит миниатюры картинок всех постов страницы разом.
+
+    Результат кладётся в post._prefetched_thumbnails, откуда его берёт
+    ready_thumbnail, не обращаясь к хранилищу по одному посту. Уже
+    найденные миниатюры повторно не читаются.
+    """
+    posts = [
+        post for post in posts
+        if post.image
+        and size not in getattr(post, '_prefetched_thumbnails', {})
+    ]
+    geometry, options = thumbnail_options(size)
+    thumbnails = _read_kvstore([
+        _thumbnail_file(ImageFile(post.image), geometry, dict(options))
+        for post in posts
+    ])
+    for post, thumbnail in zip(posts, thumbnails):
+        if not hasattr(post, '_prefetched_thumbnails'):
+            post._prefetched_thumbnails = {}
+        post._prefetched_thumbnails[size] = thumbnail
+        if thumbnail is None:
+            _queue_missing(post.image)
+
+
+def ready_thumbnail(image, size):
+    """Готовая миниатюра или None; отсутствующая ставится в очередь."""
+    if not image:
+        return None
+    prefetched = getattr(image.instance, '_prefetched_thumbnails', {})
+    if size in prefetched:
+        return prefetched[size]
+    geometry, options = thumbnail_options(size)
+    thumbnail = default.kvstore.get(
+        _thumbnail_file(ImageFile(image), geometry, options)
+    )
+    if thumbnail is None:
+        _queue_missing(image)
+    return thumbnail
@@ -1,10 +1,210 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
 
 COUNTER_POSTS = 10
+COMMENTS_PER_PAGE = 20
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, key, pk):
+    """Упаковывает ключ сортировки и id в непрозрачную строку для URL.
+
+    key — уже сериализованное значение, см. CursorPaginator.dump_key.
+    """
+    raw = f'{direction}|{key}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор, созданный encode_cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, key, pk = raw.split('|')
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursor(cursor)
+    return direction, key, pk
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, id) вместо COUNT(*) + OFFSET.
+
+    Каждая страница читается одним запросом на per_page + 1 строк,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Общее число страниц неизвестно: number и num_pages описывают
+    только соседей текущей страницы, чтобы has_next/has_previous
+    у Page работали без подсчёта строк.
+    """
+
+    date_field = 'pub_date'
+    pk_field = 'id'
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._has_previous = False
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        return 1 + self._has_previous + self._has_next
+
+    def get_page(self, cursor=None):
+        """Страница по курсору; пустой или битый курсор — первая страница."""
+        if not cursor:
+            return self._first_page()
+        try:
+            direction, key, pk = decode_cursor(cursor)
+            pub_date = self.load_key(key)
+        except (InvalidCursor, ValueError):
+            return self._first_page()
+        if direction == NEXT:
+            return self._page_after(pub_date, pk)
+        return self._page_before(pub_date, pk)
+
+    def get_offset_page(self, number):
+        """Совместимость со старыми ссылками вида ?page=N.
+
+        Обходится без COUNT(*), но OFFSET остаётся, поэтому шаблоны
+        дальше ведут по курсорам из полученной страницы.
+        """
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = self.rows_from(offset, self.per_page + 1)
+        return self._build_page(rows, has_previous=number > 1)
+
+    def rows_from(self, offset, limit):
+        """Строки начиная с offset в порядке от новых к старым."""
+        return list(self._ordered()[offset:offset + limit])
+
+    def rows_after(self, pub_date, pk, limit):
+        """Строки старше ключа, от новых к старым."""
+        return list(
+            self._ordered().filter(self._seek('lt', pub_date, pk))[:limit]
+        )
+
+    def rows_before(self, pub_date, pk, limit):
+        """Строки новее ключа, начиная с ближайшей к нему."""
+        return list(
+            self.object_list.filter(self._seek('gt', pub_date, pk))
+            .order_by(self.date_field, self.pk_field)[:limit]
+        )
+
+    def _ordered(self):
+        return self.object_list.order_by(
+            f'-{self.date_field}', f'-{self.pk_field}'
+        )
+
+    def _seek(self, lookup, pub_date, pk):
+        same_date = {
+            self.date_field: pub_date,
+            f'{self.pk_field}__{lookup}': pk,
+        }
+        # Лишнее с виду условие pub_date <= ключа даёт SQLite границу
+        # диапазона в индексе: по одному OR он просматривает индекс
+        # целиком или уходит в MULTI-INDEX OR с сортировкой.
+        bound = Q(**{f'{self.date_field}__{lookup}e': pub_date})
+        return bound & (
+            Q(**{f'{self.date_field}__{lookup}': pub_date}) | Q(**same_date)
+        )
+
+    def dump_key(self, value):
+        """Значение ключа сортировки в виде строки для курсора."""
+        return value.isoformat()
+
+    def load_key(self, raw):
+        """Обратное к dump_key; ValueError для негодной строки."""
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+
+    def _cursor(self, direction, row):
+        return encode_cursor(
+            direction,
+            self.dump_key(getattr(row, self.date_field)),
+            getattr(row, self.pk_field),
+        )
+
+    def to_objects(self, rows):
+        """Превращает строки выборки в объекты страницы."""
+        return rows
+
+    def _first_page(self):
+        rows = self.rows_from(0, self.per_page + 1)
+        return self._build_page(rows, has_previous=False)
+
+    def _page_after(self, pub_date, pk):
+        rows = self.rows_after(pub_date, pk, self.per_page + 1)
+        return self._build_page(rows, has_previous=True)
+
+    def _page_before(self, pub_date, pk):
+        rows = self.rows_before(pub_date, pk, self.per_page + 1)
+        if len(rows) <= self.per_page:
+            return self._first_page()
+        rows = rows[:self.per_page]
+        rows.reverse()
+        page = self._build_page(rows, has_previous=True)
+        self._has_next = True
+        page.next_cursor = self._cursor(NEXT, rows[-1])
+        return page
+
+    def _build_page(self, rows, has_previous):
+        self._has_next = len(rows) > self.per_page
+        self._has_previous = has_previous and bool(rows)
+        rows = rows[:self.per_page]
+        page = Page(self.to_objects(rows), 1 + self._has_previous, self)
+        page.next_cursor = (
+            self._cursor(NEXT, rows[-1]) if self._has_next else None
+        )
+        page.previous_cursor = (
+            self._cursor(PREVIOUS, rows[0]) if self._has_previous else None
+        )
+        return page
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсоры по ленте подписок: ключ берётся из записей FeedEntry,
+    а на страницу попадают сами посты."""
+
+    pk_field = 'post_id'
+
+    def to_objects(self, rows):
+        return [entry.post for entry in rows]
+
+
+class CommentPaginator(CursorPaginator):
+    """Курсоры по комментариям поста, от новых к старым."""
+
+    date_field = 'created'
+
+
+def comments_page(post_id, cursor=None):
+    comments = Comment.objects.filter(post_id=post_id).for_list()
+    return CommentPaginator(comments, COMMENTS_PER_PAGE).get_page(cursor)
 
 
-def paginator(post_list, request):
-    pgntr = Paginator(post_list, COUNTER_POSTS)
+def paginator(post_list, request, paginator_class=CursorPaginator):
+    pgntr = paginator_class(post_list, COUNTER_POSTS)
+    cursor = request.GET.get('cursor')
     page_number = request.GET.get('page')
-    page_obj = pgntr.get_page(page_number)
-    return page_obj
+    if not cursor and page_number:
+        return pgntr.get_offset_page(page_number)
+    return pgntr.get_page(cursor)
@@ -1,36 +1,55 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.budgets import query_budget
+
+from . import feeds, thumbnails
+from .caching import conditional_page, feed_cache
+from .exporting import FORMATS, export_lines
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post
-from .utils import paginator
+from .search import SearchPaginator, match_expression
+from .utils import comments_page, paginator
 
 
+@conditional_page
+@query_budget(queries=2, sql_ms=100)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
+    page_obj = paginator(post_list, request)
     context = {
         'title': 'Главная страница Yatube',
-        'page_obj': paginator(post_list, request),
+        'page_obj': page_obj,
+        **feed_cache(request, 'index', page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page
+@query_budget(queries=3, sql_ms=100)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
+    page_obj = paginator(post_list, request)
     context = {
         'title': group.title,
         'group': group,
-        'page_obj': paginator(post_list, request),
+        'page_obj': page_obj,
+        **feed_cache(request, 'group_posts', page_obj),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page
+@query_budget(queries=4, sql_ms=100)
 def profile(request, username):
-    user_profile = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(
-        author__username=username).all()
+    user_profile = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = Post.objects.filter(author=user_profile).for_feed()
     follow = Follow.objects.filter(
         user=request.user.id,
         author=user_profile
@@ -40,20 +59,45 @@ def profile(request, username):
         following = True
     else:
         following = False
+    page_obj = paginator(post_list, request)
     context = {
         'user_profile': user_profile,
         'username': username,
         'title': f'Профайл пользователя {username}',
-        'page_obj': paginator(post_list, request),
+        'page_obj': page_obj,
         'following': following,
+        **feed_cache(request, 'profile', page_obj),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+@query_budget(queries=0)
+def profile_export(request, username):
+    """Выгрузка своих постов и комментариев потоком, без сборки в памяти."""
+    if request.user.username != username:
+        return redirect('posts:profile', username=username)
+    export_format = request.GET.get('format')
+    if export_format not in FORMATS:
+        export_format = 'jsonl'
+    response = StreamingHttpResponse(
+        export_lines(request.user, export_format),
+        content_type=FORMATS[export_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.pk}.{export_format}"'
+    )
+    return response
+
+
+@conditional_page
+@query_budget(queries=4, sql_ms=100)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     post_text = post.text[:30]
-    comments = post.comments.all()
+    comments = comments_page(post.id)
     form = CommentForm()
     image = post.image or None
     context = {
@@ -66,7 +110,35 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_page
+@query_budget(queries=1, sql_ms=50)
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для подгрузки."""
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@query_budget(queries=3, sql_ms=200)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    expression = match_expression(query)
+    page_obj = None
+    if expression is not None:
+        page_obj = paginator(expression, request, SearchPaginator)
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
+@query_budget(queries=6, sql_ms=200)
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -83,10 +155,12 @@ def post_create(request):
     new_post = form.save(commit=False)
     new_post.author = request.user
     new_post.save()
+    thumbnails.enqueue(new_post.image)
     return redirect(f'/profile/{request.user}/')
 
 
 @login_required
+@query_budget(queries=7, sql_ms=200)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -105,11 +179,15 @@ def post_edit(request, post_id):
                       'title': 'Редактировать пост',
                       'is_edit': True,
                       'post': post})
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.enqueue(post.image)
     return redirect('posts:post_detail', post_id)
 
 
 @login_required
+@transaction.atomic
+@query_budget(queries=3, sql_ms=100)
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -122,16 +200,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(queries=lambda: 3 + feeds.page_queries(), sql_ms=100)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    page_obj = feeds.follow_page(request)
     context = {
         'title': 'Мои подписки',
-        'page_obj': paginator(post_list, request),
+        'page_obj': page_obj,
+        **feed_cache(request, 'follow_index', page_obj, per_user=True),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
+@query_budget(queries=7, sql_ms=200)
 def profile_follow(request, username):
     flw_user = get_object_or_404(User, username=username)
     if request.user != flw_user:
@@ -140,6 +222,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
+@query_budget(queries=6, sql_ms=200)
 def profile_unfollow(request, username):
     flw_user = get_object_or_404(User, username=username)
     follower = get_object_or_404(Follow, author=flw_user, user=request.user)
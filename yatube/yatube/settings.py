@@ -10,14 +10,59 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+import shutil
+import sys
+import tempfile
+
+# Запуск тестов (manage.py test или pytest)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# Время жизни фрагментов лент; актуальность обеспечивает
+# поколение данных, которое сбрасывают сигналы Post/Comment/Group/Follow
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Движок ленты подписок:
+# 'materialized' — записи FeedEntry, заполняемые при публикации;
+# 'merge' — слияние кэшированных лент авторов при чтении;
+# 'join' — прямой запрос Follow ⨝ Post.
+# После возврата к 'materialized' ленты нужно пересобрать
+# командой rebuild_follow_feeds.
+FOLLOW_FEED_ENGINE = 'materialized'
+
+# Сколько последних записей хранится в ленте подписок пользователя
+FOLLOW_FEED_MAX_ENTRIES = 1000
+
+# Сколько последних постов автора держится в кэше для движка 'merge'
+FOLLOW_FEED_TIMELINE_LENGTH = 200
+
+# Загруженные картинки уменьшаются до этих размеров, поворачиваются
+# по EXIF и сохраняются без метаданных в пуле из POST_IMAGE_WORKERS
+# процессов; 0 — обрабатывать в процессе запроса. Запрос с загрузкой
+# ждёт результата в любом случае
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_WORKERS = 2
+
+# Размеры миниатюр картинок постов: имя -> (геометрия, опции sorl).
+# Все размеры создаются в фоне при сохранении поста
+POST_THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
 
+# Потоков в пуле, создающем миниатюры; 0 — создавать после ответа.
+# В тестах пула нет: его потоки писали в тестовую базу, пока её
+# очищали после теста
+POST_THUMBNAIL_WORKERS = 0 if TESTING else 2
+
+# Доля запросов, для которых ServerTimingMiddleware собирает замеры
+# (SQL, шаблоны, кэш), отдаёт заголовок Server-Timing и пишет строку
+# в журнал core.middleware; 0 — не замерять. В тестах выключено, чтобы
+# строки журнала не появлялись в выводе случайным образом; тесты
+# замеров включают его сами
+SERVER_TIMING_SAMPLE_RATE = 0 if TESTING else 0.01
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -28,6 +73,66 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Кэш, отчёт о медленных запросах и стеки профилировщика лежат вне
+# дерева исходников. Тесты (manage.py test и pytest) получают свой
+# временный каталог, удаляемый при выходе, и не трогают кэш разработки
+if TESTING:
+    STATE_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+else:
+    STATE_DIR = os.path.join(tempfile.gettempdir(), 'yatube')
+
+# ProfilerMiddleware снимает стеки раз в PROFILER_INTERVAL секунд
+# у доли PROFILER_SAMPLE_RATE запросов, у всех запросов к именам URL
+# из PROFILER_URL_NAMES и у запросов сотрудников с заголовком
+# PROFILER_HEADER. Стеки пишутся в PROFILER_DIR в collapsed-формате
+# для flamegraph.pl; сводка — командой profile_summary
+PROFILER_SAMPLE_RATE = 0
+PROFILER_URL_NAMES = ()
+PROFILER_HEADER = 'X-Profile'
+PROFILER_INTERVAL = 0.001
+PROFILER_DIR = os.path.join(STATE_DIR, 'profiles')
+
+# Запросы к базе дольше SLOW_QUERY_MS миллисекунд пишутся в журнал
+# core.slow_queries с EXPLAIN QUERY PLAN, параметрами и видом и
+# сводятся по форме запроса в отчёт SLOW_QUERY_REPORT (команда
+# slow_queries); в отчёте остаются запросы за SLOW_QUERY_WINDOW
+# секунд. None — не следить
+SLOW_QUERY_MS = 100
+SLOW_QUERY_REPORT = os.path.join(STATE_DIR, 'slow_queries.sqlite3')
+SLOW_QUERY_WINDOW = 7 * 24 * 60 * 60
+
+# Метрики для Prometheus (вид /metrics): каждый воркер раз в
+# METRICS_FLUSH_INTERVAL секунд пишет свои значения в METRICS_DIR,
+# а /metrics складывает файлы всех воркеров машины. None — только
+# метрики текущего процесса (runserver). Обращения к кэшу считаются
+# по кэшам с ключами из METRICS_CACHES, остальные — как 'other'
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+# Токен сборщика метрик: заголовок Authorization: Bearer <токен>.
+# None — /metrics видят только сотрудники
+METRICS_TOKEN = None
+METRICS_CACHES = {
+    'template.cache.index_page.': 'index_page',
+    'template.cache.group_page.': 'group_page',
+    'template.cache.profile_page.': 'profile_page',
+    'template.cache.follow_page.': 'follow_page',
+    'posts:timeline:': 'timeline',
+}
+
+# Кэш в файле SQLite общий для всех воркеров на машине,
+# поэтому сбросы поколений лент видны каждому процессу
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(STATE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
+    }
+}
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -38,6 +143,12 @@ SECRET_KEY = 'q@&o)7=p=s$n6-$!am&0!y*_eebuya+sr9rlr=v9hfxo$k)$o='
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Превышение бюджета запросов вида (core.budgets.query_budget):
+# True — исключение с запросами (разработка и тесты: значение берётся
+# до того, как тестовый прогон выключит DEBUG), False — предупреждение
+# в журнал core.budgets
+QUERY_BUDGET_STRICT = DEBUG
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -67,11 +178,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -88,7 +203,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.timed.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -160,3 +275,40 @@ STATICFILES_DIRS = (
 )
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.budgets': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.deferred': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
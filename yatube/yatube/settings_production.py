@@ -0,0 +1,109 @@
+"""Настройки боевого сервера поверх yatube.settings.
+
+    DJANGO_SETTINGS_MODULE=yatube.settings_production
+
+Без DEBUG и debug_toolbar, с постоянными соединениями с базой и
+сессиями в общем кэше. Всё, что зависит от машины, задаётся
+переменными окружения YATUBE_*; обязательна только YATUBE_SECRET_KEY.
+Prometheus забирает /metrics с токеном из YATUBE_METRICS_TOKEN.
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+
+def env(name, default=None):
+    return os.environ.get(f'YATUBE_{name}', default)
+
+
+def env_int(name, default):
+    return int(env(name, default))
+
+
+def env_float(name, default):
+    return float(env(name, default))
+
+
+def env_bool(name, default):
+    value = env(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default):
+    value = env(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+SECRET_KEY = env('SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Не задана переменная YATUBE_SECRET_KEY')
+
+DEBUG = False
+# Превышение бюджета запросов — предупреждение в журнал и метрика
+QUERY_BUDGET_STRICT = False
+
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS', ['localhost'])
+INTERNAL_IPS = env_list('INTERNAL_IPS', ['127.0.0.1'])
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if not middleware.startswith('debug_toolbar.')
+]
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['OPTIONS']['context_processors'].remove(
+    'django.template.context_processors.debug'
+)
+
+# Файлы, общие для всех воркеров машины: кэш, метрики, отчёт
+# о медленных запросах и стеки профилировщика
+STATE_DIR = env('STATE_DIR', '/var/tmp/yatube')
+
+# Соединение с базой живёт CONN_MAX_AGE секунд, а не один запрос;
+# timeout — сколько SQLite ждёт блокировку записи другого воркера
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env('DATABASE', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': env_int('CONN_MAX_AGE', 600),
+        'OPTIONS': {'timeout': env_int('DATABASE_TIMEOUT', 20)},
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(STATE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': env_int('CACHE_MAX_ENTRIES', 200000),
+            'MAX_SIZE': env_int('CACHE_MAX_SIZE', 512 * 1024 * 1024),
+            'BUSY_TIMEOUT': 10,
+            'ACCESS_RESOLUTION': 10,
+        },
+    }
+}
+
+# Сессия читается из общего кэша, в базу идёт только запись
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_COOKIE_AGE = env_int('SESSION_COOKIE_AGE', 14 * 24 * 60 * 60)
+SESSION_COOKIE_SECURE = env_bool('HTTPS', True)
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+
+STATIC_ROOT = env('STATIC_ROOT', os.path.join(BASE_DIR, 'static_root'))
+MEDIA_ROOT = env('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+METRICS_DIR = os.path.join(STATE_DIR, 'metrics')
+METRICS_TOKEN = env('METRICS_TOKEN')
+SLOW_QUERY_MS = env_float('SLOW_QUERY_MS', 100)
+SLOW_QUERY_REPORT = os.path.join(STATE_DIR, 'slow_queries.sqlite3')
+PROFILER_DIR = os.path.join(STATE_DIR, 'profiles')
+PROFILER_SAMPLE_RATE = env_float('PROFILER_SAMPLE_RATE', 0)
+SERVER_TIMING_SAMPLE_RATE = env_float('SERVER_TIMING_SAMPLE_RATE', 0.01)